@@ -0,0 +1,241 @@
+"""Пакетна озвучка без графічного інтерфейсу.
+
+Файли розподіляються між кількома процесами; кожен процес тримає свої движки
+завантаженими між файлами. Прогрес виводиться в stdout рядками JSON.
+
+Приклади:
+    python batch.py season1/ --engine edge --voice "Ostap (чоловічий)" --workers 4
+    python batch.py ep01.srt ep02.srt --engine piper --voice "Катря (український)" --durations durations.csv
+    python batch.py ep01.srt --voice "Ostap (чоловічий)" --voice "piper:Катря (український)"
+
+    python batch.py season1/ --format aac --mux-video
+    python batch.py film.srt --incremental
+
+--incremental зберігає доріжку в каталозі завдання; після правки SRT повторний
+запуск переозвучує лише змінені субтитри.
+
+--voice можна повторювати: файл розбирається один раз і озвучується кожним
+голосом у свій файл. Префікс "движок:" задає движок для окремого голосу.
+
+Файл тривалостей - CSV (файл,тривалість) або JSON ({"файл": тривалість}).
+Тривалість: "хв:сек", "год:хв:сек" або кількість секунд.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import main
+
+# Движки, які можна вказати в --engine або префіксом голосу
+ENGINES = ["edge", "piper", "mms", "espnet"]
+
+# Черга подій робочого процесу (задається в init_worker)
+EVENTS = None
+
+def emit(event):
+    """Друкує подію одним рядком JSON"""
+    sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+def parse_duration(value):
+    """Перетворює "хв:сек", "год:хв:сек" або секунди на мілісекунди (None - без тривалості)"""
+    value = str(value).strip()
+    if not value:
+        return None
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return int(round(seconds * 1000)) if seconds > 0 else None
+
+def load_durations(sidecar_path):
+    """Читає файл тривалостей: назва або шлях SRT -> мілісекунди"""
+    with open(sidecar_path, encoding="utf-8") as f:
+        if sidecar_path.lower().endswith(".json"):
+            raw = json.load(f).items()
+        else:
+            raw = [row for row in csv.reader(f) if len(row) >= 2]
+
+    durations = {}
+    for name, value in raw:
+        try:
+            durations[name.strip()] = parse_duration(value)
+        except ValueError:
+            # Рядок заголовка CSV або некоректне значення
+            continue
+    return durations
+
+def collect_srt_files(paths):
+    """Розгортає каталоги в список SRT файлів"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(str(p) for p in Path(path).glob("*.srt")))
+        else:
+            files.append(path)
+    return files
+
+def init_worker(events):
+    """Ініціалізація робочого процесу"""
+    global EVENTS
+    EVENTS = events
+
+def parse_voices(values, default_engine):
+    """Перетворює значення --voice ("голос" або "движок:голос") на [(движок, id, назва)]"""
+    voices = []
+    for value in values or [None]:
+        engine_type = default_engine
+        if value and ":" in value and value.split(":", 1)[0] in ENGINES:
+            engine_type, value = value.split(":", 1)
+        names = main.get_voice_names(engine_type)
+        voice_name = value or (names[0] if names else None)
+        if voice_name not in names:
+            raise ValueError(f"невідомий голос {voice_name!r} для {engine_type}; доступні: {', '.join(names)}")
+        voices.append((engine_type, main.get_voice_id(engine_type, voice_name), voice_name))
+    return voices
+
+def render_file(srt_path, voices, target_duration_ms, streaming, verbose, trace_dir=None, disk_timeline=False, sample_rate=None, channels=None, output_format=None, mux_video=False, incremental=False):
+    """Озвучує один файл усіма голосами в робочому процесі; движки лишаються завантаженими для наступних"""
+    started = time.time()
+    last_percent = [-1]
+
+    def progress_callback(percent):
+        if percent != last_percent[0]:
+            last_percent[0] = percent
+            EVENTS.put({"event": "progress", "file": srt_path, "percent": percent})
+
+    def log_callback(message):
+        message = message.strip()
+        if verbose and message:
+            EVENTS.put({"event": "log", "file": srt_path, "message": message})
+
+    EVENTS.put({"event": "start", "file": srt_path, "pid": os.getpid()})
+    trace_path = os.path.join(trace_dir, f"{Path(srt_path).stem}.trace.json") if trace_dir else None
+    video_path = main.find_video_for_srt(srt_path) if mux_video else None
+    try:
+        if mux_video and video_path is None:
+            raise Exception(f"не знайдено відео ({', '.join(main.VIDEO_EXTENSIONS)}) з назвою {Path(srt_path).stem}")
+        results = main.process_srt_to_voices(
+            srt_path,
+            voices,
+            target_duration_ms,
+            progress_callback,
+            log_callback,
+            {'stopped': False},
+            streaming=streaming,
+            trace_path=trace_path,
+            disk_timeline=disk_timeline,
+            sample_rate=sample_rate,
+            channels=channels,
+            output_format=output_format,
+            video_path=video_path,
+            incremental=incremental
+        )
+        error = None if all(results.values()) else "див. лог (--verbose)"
+    except Exception as e:
+        results = {voice_name: False for _, _, voice_name in voices}
+        error = str(e)
+
+    outputs = [
+        {"voice": voice_name, "ok": results[voice_name],
+         "output": str(main.voice_output_path(srt_path, voice_name, output_format, video_path)) if results[voice_name] else None}
+        for _, _, voice_name in voices
+    ]
+    return {
+        "event": "done",
+        "file": srt_path,
+        "ok": all(results.values()),
+        "output": outputs[0]["output"],
+        "outputs": outputs,
+        "error": error,
+        "seconds": round(time.time() - started, 2),
+        "trace": trace_path
+    }
+
+def forward_events(events):
+    """Пересилає події робочих процесів у stdout, доки не прийде None"""
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        emit(event)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Пакетна озвучка SRT файлів без інтерфейсу")
+    parser.add_argument("paths", nargs="+", help="SRT файли або каталоги з ними")
+    parser.add_argument("--engine", choices=ENGINES, default="edge", help="Движок для голосів без префікса")
+    parser.add_argument("--voice", action="append", help="Назва голосу, як в інтерфейсі, можна \"движок:голос\"; "
+                        "повторюється для кількох голосів (за замовчуванням - перший голос движка)")
+    parser.add_argument("--durations", help="CSV або JSON з тривалістю відео для кожного файлу")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Кількість процесів")
+    parser.add_argument("--streaming", action="store_true", help="Потокове збирання (менше пам'яті)")
+    parser.add_argument("--disk-timeline", action="store_true", help="Збирати доріжку у тимчасовому файлі на диску")
+    parser.add_argument("--sample-rate", type=int, help=f"Частота доріжки, Гц (за замовчуванням {main.TIMELINE_SAMPLE_RATE})")
+    parser.add_argument("--channels", type=int, choices=[1, 2], help=f"Каналів у доріжці (за замовчуванням {main.TIMELINE_CHANNELS})")
+    parser.add_argument("--format", choices=list(main.OUTPUT_FORMATS), default=main.OUTPUT_FORMAT,
+                        help="Формат результату (кодується один раз)")
+    parser.add_argument("--mux-video", action="store_true",
+                        help="Вбудувати озвучку у відео з тією ж назвою, що й SRT (відеопотік копіюється)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Після правки SRT переозвучувати лише змінені субтитри (доріжка зберігається між запусками)")
+    parser.add_argument("--verbose", action="store_true", help="Також виводити лог обробки")
+    parser.add_argument("--trace", metavar="DIR", help="Зберігати траси етапів (Chrome trace JSON) у каталог")
+    args = parser.parse_args()
+
+    try:
+        voices = parse_voices(args.voice, args.engine)
+    except ValueError as e:
+        parser.error(str(e))
+
+    files = collect_srt_files(args.paths)
+    durations = load_durations(args.durations) if args.durations else {}
+    workers = max(1, min(args.workers, len(files) or 1))
+
+    emit({"event": "batch", "files": len(files), "workers": workers, "engine": voices[0][0], "voice": voices[0][2],
+          "voices": [f"{engine_type}:{voice_name}" for engine_type, _, voice_name in voices]})
+
+    events = multiprocessing.Queue()
+    printer = threading.Thread(target=forward_events, args=(events,))
+    printer.start()
+
+    succeeded = 0
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(events,))
+    try:
+        futures = {}
+        for srt_path in files:
+            target = durations.get(srt_path, durations.get(os.path.basename(srt_path)))
+            futures[executor.submit(
+                render_file, srt_path, voices, target,
+                args.streaming, args.verbose, args.trace, args.disk_timeline, args.sample_rate, args.channels,
+                args.format, args.mux_video, args.incremental
+            )] = srt_path
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # Робочий процес аварійно завершився
+                result = {"event": "done", "file": futures[future], "ok": False, "output": None, "outputs": [], "error": str(e)}
+            succeeded += result["ok"]
+            events.put(result)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        events.put({"event": "interrupted"})
+        events.put(None)
+        printer.join()
+        return 130
+
+    executor.shutdown()
+    events.put({"event": "summary", "total": len(files), "ok": succeeded, "failed": len(files) - succeeded})
+    events.put(None)
+    printer.join()
+    return 0 if succeeded == len(files) else 1
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
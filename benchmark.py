@@ -0,0 +1,375 @@
+"""Відтворюваний офлайн бенчмарк конвеєра озвучки.
+
+Генерує синтетичні SRT (кількість субтитрів, їх довжина, розподіл пауз задаються
+параметрами, випадковість - з фіксованим seed) і проганяє process_srt_to_audio.
+Движок "tone" працює в процесі і замість мовлення віддає тон, довжина якого
+залежить лише від тексту. Piper і MMS додаються, якщо моделі є на диску.
+
+Для кожного прогону записується: загальний час, субтитрів за секунду,
+real-time factor (час обробки / тривалість аудіо), кількість запущених
+підпроцесів і пікова пам'ять процесу - загалом і по етапах.
+
+Приклади:
+    python benchmark.py --cues 50 200 --output bench_new.json
+    python benchmark.py --cues 200 --engines tone piper --compare bench_old.json
+    python benchmark.py --cues 50 --engines mms mms-onnx mms-onnx-int8
+    python benchmark.py --check-timing 3000
+
+--check-timing лише перевіряє план таймінгу (plan_timing) на випадкових SRT,
+у тому числі з цільовою тривалістю, у яку озвучка не влазить навіть на межі
+стискання: субтитри не мають накладатися.
+"""
+import argparse
+import bisect
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import main
+
+# Скільки мілісекунд тону движок "tone" генерує на один символ тексту
+TONE_MS_PER_CHAR = 60
+TONE_SAMPLE_RATE = 22050
+
+# Варіанти движка MMS у бенчмарку -> main.MMS_BACKEND
+MMS_BACKENDS = {"mms": "eager", "mms-onnx": "onnx", "mms-onnx-int8": "onnx-int8"}
+
+WORDS = ["привіт", "субтитр", "озвучка", "голос", "відео", "швидко", "тиша", "таймінг", "файл", "звук"]
+
+def tone_synthesize(text, engine_type, voice_id, fallback=main.synthesize_audio):
+    """Детермінований движок-заглушка: синусоїда 220 Гц, тривалість пропорційна тексту"""
+    if engine_type != "tone":
+        return fallback(text, engine_type, voice_id)
+    num_samples = int(len(text) * TONE_MS_PER_CHAR * TONE_SAMPLE_RATE / 1000)
+    t = np.arange(num_samples, dtype=np.float32) / TONE_SAMPLE_RATE
+    pcm = 0.3 * np.sin(2 * np.pi * 220 * t)
+    return main.pcm_to_wav_bytes(pcm, TONE_SAMPLE_RATE), 'wav'
+
+def format_timestamp(ms):
+    """Мілісекунди у формат часу SRT"""
+    hours, ms = divmod(int(ms), 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def generate_srt(path, cues, cue_ms, gap, gap_ms, speech_ratio, seed):
+    """Пише синтетичний SRT; повертає тривалість відео в мс.
+
+    Довжина тексту підбирається так, щоб тон займав cue_ms * speech_ratio з
+    випадковим розкидом ±40%, тож частина субтитрів розтягується, а частина стискається.
+    """
+    rng = random.Random(seed)
+    position = gap_ms
+    blocks = []
+    for i in range(1, cues + 1):
+        length = int(cue_ms * rng.uniform(0.7, 1.3))
+        chars = max(1, int(length * speech_ratio * rng.uniform(0.6, 1.4) / TONE_MS_PER_CHAR))
+        words = []
+        while len(" ".join(words)) < chars:
+            words.append(rng.choice(WORDS))
+        text = " ".join(words)[:chars]
+        blocks.append(f"{i}\n{format_timestamp(position)} --> {format_timestamp(position + length)}\n{text}\n")
+        position += length
+
+        if gap == "fixed":
+            pause = gap_ms
+        elif gap == "uniform":
+            pause = rng.uniform(0, 2 * gap_ms)
+        else:
+            pause = rng.expovariate(1.0 / gap_ms) if gap_ms else 0
+        position += int(pause)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(blocks))
+    return position
+
+def current_rss():
+    """Поточна пам'ять процесу в байтах (None, якщо виміряти нема чим)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class ResourceMonitor:
+    """Фоново записує пам'ять процесу і моменти запуску підпроцесів"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self.spawns = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.original_init = subprocess.Popen.__init__
+
+    def _sample(self):
+        while not self.stopped.is_set():
+            rss = current_rss()
+            if rss is not None:
+                self.samples.append((time.perf_counter(), rss))
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        monitor = self
+        original_init = self.original_init
+
+        def counting_init(popen, *args, **kwargs):
+            monitor.spawns.append(time.perf_counter())
+            original_init(popen, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counting_init
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        subprocess.Popen.__init__ = self.original_init
+
+    def peak_rss(self, intervals=None):
+        """Пікова пам'ять (МБ) за весь прогін або в межах інтервалів"""
+        if intervals is None:
+            values = [rss for _, rss in self.samples]
+        else:
+            times = [t for t, _ in self.samples]
+            values = []
+            for start, end in intervals:
+                # Останній замір перед початком теж рахується: короткий етап може не потрапити на жоден
+                first = max(0, bisect.bisect_left(times, start) - 1)
+                last = bisect.bisect_right(times, end)
+                values.extend(rss for _, rss in self.samples[first:last])
+        return round(max(values) / (1024 * 1024), 1) if values else None
+
+    def spawn_count(self, intervals=None):
+        """Кількість запущених підпроцесів за весь прогін або в межах інтервалів"""
+        if intervals is None:
+            return len(self.spawns)
+        return sum(1 for t in self.spawns if any(start <= t <= end for start, end in intervals))
+
+def engine_available(engine_type):
+    """Чи можна запустити движок на цій машині; повертає (так/ні, причина)"""
+    if engine_type == "piper" and not main.get_piper_models():
+        return False, "Piper моделі не знайдено"
+    if engine_type == "mms":
+        try:
+            import transformers  # noqa: F401
+            import torch  # noqa: F401
+        except ImportError:
+            return False, "не встановлено transformers/torch"
+    elif engine_type in MMS_BACKENDS:
+        try:
+            import transformers  # noqa: F401
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            return False, "не встановлено transformers/onnxruntime"
+    return True, None
+
+def default_voice(engine_type):
+    """Перший голос движка"""
+    if engine_type == "tone":
+        return "tone", "Tone"
+    if engine_type in MMS_BACKENDS:
+        engine_type = "mms"
+    voice_name = main.get_voice_names(engine_type)[0]
+    return main.get_voice_id(engine_type, voice_name), voice_name
+
+def run_scenario(srt_path, target_ms, engine_type, streaming, disk_timeline=False):
+    """Один прогін process_srt_to_audio з чистими кешем і завданнями"""
+    voice_id, voice_name = default_voice(engine_type)
+    work_dir = os.path.dirname(srt_path)
+    main.JOBS_DIR = os.path.join(work_dir, "jobs")
+    main.SYNTHESIS_CACHE_DIR = os.path.join(work_dir, "cache")
+    main.SYNTHESIS_CACHE_MAX_BYTES = 0
+    main.SYNTHESIS_CACHE = None
+    shutil.rmtree(main.JOBS_DIR, ignore_errors=True)
+    if engine_type in MMS_BACKENDS:
+        # Модель завантажується заново в кожному прогоні, щоб етап load.mms було видно
+        main.MMS_BACKEND = MMS_BACKENDS[engine_type]
+        main.unload_mms_model()
+        engine_type = "mms"
+
+    log = []
+    tracer = main.Tracer()
+    token = main.TRACER.set(tracer)
+    with ResourceMonitor() as monitor:
+        started = time.perf_counter()
+        ok = main.process_srt_to_audio(
+            srt_path, engine_type, voice_id, voice_name, target_ms,
+            lambda percent: None, log.append, {'stopped': False}, streaming=streaming, disk_timeline=disk_timeline
+        )
+        wall = time.perf_counter() - started
+    main.TRACER.reset(token)
+
+    if not ok:
+        return {"ok": False, "error": "".join(log[-3:]).strip()}
+
+    stages = {}
+    for span in tracer.spans:
+        stage = stages.setdefault(span["name"], {"intervals": [], "seconds": 0.0})
+        stage["intervals"].append((span["start"], span["end"]))
+        stage["seconds"] += span["end"] - span["start"]
+    for name, stage in stages.items():
+        intervals = stage.pop("intervals")
+        stage["seconds"] = round(stage["seconds"], 4)
+        stage["calls"] = len(intervals)
+        stage["subprocesses"] = monitor.spawn_count(intervals)
+        stage["peak_rss_mb"] = monitor.peak_rss(intervals)
+
+    output = os.path.join(work_dir, f"{voice_name.split()[0]} - {os.path.splitext(os.path.basename(srt_path))[0]}.mp3")
+    audio_s = main.probe_audio_duration(output) / 1000.0
+    cues = len(main.parse_srt_file(srt_path))
+    return {
+        "ok": True,
+        "wall_s": round(wall, 3),
+        "cues_per_s": round(cues / wall, 2),
+        "audio_s": round(audio_s, 3),
+        "rtf": round(wall / audio_s, 5) if audio_s else None,
+        "subprocesses": monitor.spawn_count(),
+        "peak_rss_mb": monitor.peak_rss(),
+        "stages": stages
+    }
+
+def check_timing(cases, seed):
+    """Перевіряє plan_timing на випадкових субтитрах; повертає кількість планів з помилками"""
+    rng = random.Random(seed)
+    sample_rate = main.TIMELINE_SAMPLE_RATE
+    failures = unreachable = 0
+    for case in range(cases):
+        cues, start = [], 0
+        for index in range(1, rng.randint(1, 12) + 1):
+            start += rng.randint(0, 3000)
+            duration = rng.randint(200, 4000)
+            cues.append({"index": index, "start_ms": start, "end_ms": start + duration, "text": "x"})
+            start += duration
+        natural_lengths = [main.ms_to_samples(rng.randint(0, 8000), sample_rate) for _ in cues]
+        target = main.ms_to_samples(rng.randint(500, start + 4000), sample_rate) if rng.random() < 0.8 else None
+        plan, total = main.plan_timing(cues, natural_lengths, sample_rate, target)
+
+        fastest = [int(np.ceil(length / main.STRETCH_MAX_RATIO)) for length in natural_lengths]
+        reachable = target is None or sum(fastest) <= target
+        unreachable += not reachable
+        errors = [
+            f"субтитр {i + 2} накладається на попередній"
+            for i in range(len(plan) - 1) if plan[i]["start"] + plan[i]["length"] > plan[i + 1]["start"]
+        ]
+        errors += [f"субтитр {i + 1} стиснуто понад межу" for i, slot in enumerate(plan) if slot["length"] < fastest[i]]
+        if reachable and plan and plan[-1]["start"] + plan[-1]["length"] > total:
+            errors.append("озвучка виходить за цільову тривалість")
+        if errors:
+            failures += 1
+            print(f"випадок {case}: {'; '.join(errors)}")
+    print(f"План таймінгу: {cases} випадків ({unreachable} з недосяжною тривалістю), з помилками {failures}")
+    return failures
+
+def compare(results, baseline_path):
+    """Друкує зміну загального часу відносно попереднього звіту"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {item["scenario"]: item for item in json.load(f)["results"]}
+    print(f"\nПорівняння з {baseline_path}:")
+    for item in results:
+        old = baseline.get(item["scenario"])
+        if not old or not old.get("ok") or not item.get("ok"):
+            continue
+        change = (item["wall_s"] - old["wall_s"]) / old["wall_s"] * 100
+        print(f"  {item['scenario']}: {old['wall_s']:.2f}с -> {item['wall_s']:.2f}с ({change:+.1f}%)")
+
+def git_revision():
+    """Поточний коміт репозиторію (щоб звіти різних версій можна було розрізнити)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк конвеєра озвучки")
+    parser.add_argument("--cues", type=int, nargs="+", default=[50, 200], help="Кількість субтитрів у сценаріях")
+    parser.add_argument("--cue-ms", type=int, default=2500, help="Середня довжина субтитру, мс")
+    parser.add_argument("--gap", choices=["fixed", "uniform", "exponential"], default="exponential")
+    parser.add_argument("--gap-ms", type=int, default=800, help="Середня пауза між субтитрами, мс")
+    parser.add_argument("--speech-ratio", type=float, default=1.0, help="Тривалість мовлення / довжина субтитру")
+    parser.add_argument("--engines", nargs="+", default=["tone"], choices=["tone", "piper", *MMS_BACKENDS])
+    parser.add_argument("--streaming", action="store_true", help="Також прогнати потокове збирання")
+    parser.add_argument("--disk-timeline", action="store_true", help="Також прогнати збирання доріжки на диску")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторів кожного сценарію (береться найкращий)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="Попередній звіт для порівняння")
+    parser.add_argument("--check-timing", type=int, metavar="N",
+                        help="Лише перевірити план таймінгу на N випадкових SRT і вийти")
+    args = parser.parse_args()
+
+    if args.check_timing:
+        return 1 if check_timing(args.check_timing, args.seed) else 0
+
+    main.synthesize_audio = tone_synthesize
+    main.ENGINE_CONCURRENCY.setdefault("tone", os.cpu_count() or 1)
+    # (назва режиму, streaming, disk_timeline)
+    modes = [("", False, False)]
+    if args.streaming:
+        modes.append(("/streaming", True, False))
+    if args.disk_timeline:
+        modes.append(("/disk", False, True))
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for engine_type in args.engines:
+            available, reason = engine_available(engine_type)
+            for cues in args.cues:
+                srt_path = os.path.join(work_dir, f"bench_{cues}.srt")
+                target_ms = generate_srt(srt_path, cues, args.cue_ms, args.gap, args.gap_ms, args.speech_ratio, args.seed)
+                for suffix, streaming, disk_timeline in modes:
+                    scenario = f"{engine_type}/{cues}{suffix}"
+                    if not available:
+                        results.append({"scenario": scenario, "ok": False, "skipped": reason})
+                        print(f"{scenario}: пропущено ({reason})")
+                        continue
+                    runs = [run_scenario(srt_path, target_ms, engine_type, streaming, disk_timeline) for _ in range(args.repeat)]
+                    best = min(runs, key=lambda run: run.get("wall_s", float("inf")))
+                    best = {
+                        "scenario": scenario, "engine": engine_type, "cues": cues,
+                        "streaming": streaming, "disk_timeline": disk_timeline, **best
+                    }
+                    results.append(best)
+                    if best["ok"]:
+                        print(f"{scenario}: {best['wall_s']:.2f}с, {best['cues_per_s']} суб/с, "
+                              f"RTF {best['rtf']}, підпроцесів {best['subprocesses']}, пам'ять {best['peak_rss_mb']} МБ")
+                    else:
+                        print(f"{scenario}: помилка - {best['error']}")
+
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "cue_ms": args.cue_ms, "gap": args.gap, "gap_ms": args.gap_ms,
+            "speech_ratio": args.speech_ratio, "seed": args.seed, "repeat": args.repeat
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nЗвіт: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,484 @@
+"""Фонова озвучка: стежить за каталогами і озвучує нові SRT файли.
+
+Кожен стабільний (не змінювався між двома перевірками) SRT у каталогах
+потрапляє в постійну чергу SQLite, тож після перезапуску черга і стан
+завдань зберігаються, а перервані завдання продовжуються з журналу JobManifest.
+Параметри файлу задає супровідний JSON поруч із ним, "назва.voice.json":
+
+    {"duration": "42:10", "voice": ["Ostap (чоловічий)", "piper:Катря (український)"],
+     "priority": 10, "format": "aac", "mux_video": true}
+
+Усі поля необов'язкові; чого немає - береться з параметрів запуску. Завдання
+з більшим priority беруться першими. Одночасно виконується не більше --jobs
+завдань і не більше --limit завдань на кожен движок; завдання, чий движок
+зайнятий, пропускає вперед наступні. Події виводяться в stdout рядками JSON,
+а стан черги (у черзі, виконуються, готові, з помилкою) пишеться у --status.
+
+Приклади:
+    python daemon.py //server/dubbing/incoming --engine edge --status queue_status.json
+    python daemon.py incoming/ urgent/ --jobs 4 --limit edge=3 --limit mms=1
+    python daemon.py --print-status
+    python daemon.py incoming/ --incremental
+
+З --incremental виправлений і перезбережений SRT переозвучується лише в
+змінених субтитрах, а решта доріжки береться з попереднього рендеру.
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import main
+import batch
+from batch import parse_duration, parse_voices, ENGINES
+
+# Постійна черга завдань
+QUEUE_DB = "srt_voice_queue.sqlite3"
+# Скільки завдань кожного движка виконується одночасно (якщо не задано --limit)
+ENGINE_JOB_LIMITS = {"edge": 2, "piper": 1, "mms": 1, "espnet": 1}
+# Суфікс супровідного файлу: "фільм.srt" -> "фільм.voice.json"
+SIDECAR_SUFFIX = ".voice.json"
+# Скільки готових завдань показувати у стані
+STATUS_RECENT = 50
+# Події пишуть і потоки завдань, тож рядки не повинні перемішуватися
+EMIT_LOCK = threading.Lock()
+
+def emit(event):
+    """Друкує подію одним рядком JSON (з будь-якого потоку)"""
+    with EMIT_LOCK:
+        batch.emit(event)
+
+class JobQueue:
+    """Черга завдань у SQLite: один рядок на SRT файл.
+
+    signature - розмір і час зміни SRT та супровідного файлу; якщо вони
+    змінилися, завдання повертається в чергу з новими параметрами.
+    """
+
+    def __init__(self, db_path=QUEUE_DB):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    srt TEXT UNIQUE NOT NULL,
+                    signature TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    params TEXT NOT NULL,
+                    engines TEXT NOT NULL,
+                    outputs TEXT,
+                    error TEXT,
+                    queued_at REAL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+
+    def recover(self):
+        """Повертає в чергу завдання, що виконувалися, коли демон зупинився або впав"""
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET state = 'queued', started_at = NULL WHERE state = 'running'")
+
+    def get(self, srt_path):
+        return self.connection.execute("SELECT * FROM jobs WHERE srt = ?", (srt_path,)).fetchone()
+
+    def put(self, srt_path, signature, priority, params, engines, state="queued", outputs=None, error=None):
+        """Ставить файл у чергу (або замінює його попереднє завдання)"""
+        now = time.time()
+        with self.connection:
+            self.connection.execute("""
+                INSERT INTO jobs (srt, signature, state, priority, params, engines, outputs, error, queued_at, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)
+                ON CONFLICT(srt) DO UPDATE SET
+                    signature = excluded.signature, state = excluded.state, priority = excluded.priority,
+                    params = excluded.params, engines = excluded.engines, outputs = excluded.outputs,
+                    error = excluded.error, queued_at = excluded.queued_at, started_at = NULL,
+                    finished_at = excluded.finished_at
+            """, (
+                srt_path, signature, state, priority, json.dumps(params, ensure_ascii=False), json.dumps(engines),
+                json.dumps(outputs, ensure_ascii=False) if outputs is not None else None, error,
+                now, now if state != "queued" else None
+            ))
+
+    def queued(self):
+        """Завдання в черзі: спершу вищий пріоритет, далі - хто раніше прийшов"""
+        return self.connection.execute(
+            "SELECT * FROM jobs WHERE state = 'queued' ORDER BY priority DESC, queued_at, id"
+        ).fetchall()
+
+    def start(self, job_id):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = 'running', started_at = ?, error = NULL WHERE id = ?", (time.time(), job_id)
+            )
+
+    def finish(self, job_id, state, outputs, error):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, outputs = ?, error = ?, finished_at = ? WHERE id = ?",
+                (state, json.dumps(outputs, ensure_ascii=False), error, time.time(), job_id)
+            )
+
+    def requeue(self, job_id):
+        """Повертає перерване завдання в чергу"""
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET state = 'queued', started_at = NULL WHERE id = ?", (job_id,))
+
+    def status(self, recent=STATUS_RECENT):
+        """Стан черги як словник для JSON"""
+        def describe(row):
+            return {
+                "id": row["id"],
+                "srt": row["srt"],
+                "priority": row["priority"],
+                "engines": json.loads(row["engines"]),
+                "voices": [voice for _, _, voice in json.loads(row["params"])["voices"]],
+                "outputs": json.loads(row["outputs"]) if row["outputs"] else None,
+                "error": row["error"],
+                "queued_at": row["queued_at"],
+                "started_at": row["started_at"],
+                "finished_at": row["finished_at"]
+            }
+
+        def finished(state):
+            return [describe(row) for row in self.connection.execute(
+                "SELECT * FROM jobs WHERE state = ? ORDER BY finished_at DESC LIMIT ?", (state, recent)
+            )]
+
+        counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {
+            "updated": time.time(),
+            "counts": {state: counts.get(state, 0) for state in ("queued", "running", "done", "failed")},
+            "queued": [describe(row) for row in self.queued()],
+            "running": [describe(row) for row in self.connection.execute("SELECT * FROM jobs WHERE state = 'running'")],
+            "done": finished("done"),
+            "failed": finished("failed")
+        }
+
+    def close(self):
+        self.connection.close()
+
+def sidecar_path(srt_path):
+    return str(Path(srt_path).with_suffix(SIDECAR_SUFFIX))
+
+def file_signature(srt_path):
+    """Розмір і час зміни SRT та його супровідного файлу"""
+    parts = []
+    for path in (srt_path, sidecar_path(srt_path)):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append("-")
+    return "|".join(parts)
+
+def read_job_params(srt_path, defaults):
+    """Параметри завдання: супровідний файл поверх параметрів запуску.
+
+    Повертає (пріоритет, параметри для JSON). ValueError - некоректний файл.
+    """
+    sidecar = {}
+    if os.path.exists(sidecar_path(srt_path)):
+        with open(sidecar_path(srt_path), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if not isinstance(sidecar, dict):
+            raise ValueError(f"{sidecar_path(srt_path)}: очікується JSON об'єкт")
+
+    voices = sidecar.get("voice", defaults.voice)
+    if isinstance(voices, str):
+        voices = [voices]
+    output_format = sidecar.get("format", defaults.format)
+    if output_format not in main.OUTPUT_FORMATS:
+        raise ValueError(f"невідомий формат {output_format!r}")
+    duration = sidecar.get("duration")
+    params = {
+        "voices": parse_voices(voices, sidecar.get("engine", defaults.engine)),
+        "duration_ms": parse_duration(duration) if duration is not None else None,
+        "format": output_format,
+        "mux_video": bool(sidecar.get("mux_video", defaults.mux_video))
+    }
+    return int(sidecar.get("priority", defaults.priority)), params
+
+def outputs_up_to_date(srt_path, params):
+    """Чи вже є результати всіх голосів, новіші за SRT (файл озвучено до запуску)"""
+    video_path = main.find_video_for_srt(srt_path) if params["mux_video"] else None
+    if params["mux_video"] and video_path is None:
+        return False
+    srt_mtime = os.path.getmtime(srt_path)
+    for _, _, voice_name in params["voices"]:
+        output = main.voice_output_path(srt_path, voice_name, params["format"], video_path)
+        if not output.exists() or output.stat().st_mtime < srt_mtime:
+            return False
+    return True
+
+class WatchDaemon:
+    """Стежить за каталогами, наповнює чергу і запускає завдання в потоках.
+
+    Усі звернення до бази - лише з головного потоку; потоки завдань
+    повідомляють про завершення через self.results.
+    """
+
+    def __init__(self, job_queue, directories, defaults, max_jobs, engine_limits, status_path=None, verbose=False):
+        self.job_queue = job_queue
+        self.directories = directories
+        self.defaults = defaults
+        self.max_jobs = max_jobs
+        self.engine_limits = engine_limits
+        self.status_path = status_path
+        self.verbose = verbose
+        # Розмір і час зміни файлів з попередньої перевірки: у чергу йдуть лише ті,
+        # що не змінилися між двома перевірками (дописані до кінця)
+        self.pending = {}
+        # id завдання -> (потік, stop_flag, движки)
+        self.running = {}
+        self.results = queue.Queue()
+        self.stopping = False
+
+    def engine_load(self):
+        load = {}
+        for _, _, engines in self.running.values():
+            for engine_type in engines:
+                load[engine_type] = load.get(engine_type, 0) + 1
+        return load
+
+    def scan(self):
+        """Шукає нові або змінені SRT; повертає True, якщо черга змінилася"""
+        changed = False
+        seen = set()
+        for directory in self.directories:
+            for path in sorted(Path(directory).glob("*.srt")):
+                srt_path = str(path.resolve())
+                seen.add(srt_path)
+                signature = file_signature(srt_path)
+                if self.pending.get(srt_path) != signature:
+                    self.pending[srt_path] = signature
+                    continue
+
+                job = self.job_queue.get(srt_path)
+                if job is not None and (job["signature"] == signature or job["state"] == "running"):
+                    continue
+                changed |= self.enqueue(srt_path, signature)
+
+        for srt_path in set(self.pending) - seen:
+            del self.pending[srt_path]
+        return changed
+
+    def enqueue(self, srt_path, signature):
+        try:
+            priority, params = read_job_params(srt_path, self.defaults)
+        except (ValueError, OSError) as e:
+            self.job_queue.put(srt_path, signature, 0, {"voices": []}, [], state="failed", outputs=[], error=str(e))
+            emit({"event": "rejected", "file": srt_path, "error": str(e)})
+            return True
+
+        engines = sorted({engine_type for engine_type, _, _ in params["voices"]})
+        if self.job_queue.get(srt_path) is None and outputs_up_to_date(srt_path, params):
+            # Вже озвучено раніше, не повторюємо
+            self.job_queue.put(srt_path, signature, priority, params, engines, state="done", outputs=[])
+            return True
+
+        self.job_queue.put(srt_path, signature, priority, params, engines)
+        emit({"event": "queued", "file": srt_path, "priority": priority, "engines": engines})
+        return True
+
+    def schedule(self):
+        """Запускає завдання з черги, доки є вільні місця; повертає True, якщо щось запущено"""
+        started = False
+        load = self.engine_load()
+        for job in self.job_queue.queued():
+            if len(self.running) >= self.max_jobs:
+                break
+            engines = json.loads(job["engines"])
+            if any(load.get(engine_type, 0) >= self.engine_limits.get(engine_type, 1) for engine_type in engines):
+                # Движок зайнятий - пропускаємо вперед завдання інших движків
+                continue
+            for engine_type in engines:
+                load[engine_type] = load.get(engine_type, 0) + 1
+            self.start(job, engines)
+            started = True
+        return started
+
+    def start(self, job, engines):
+        self.job_queue.start(job["id"])
+        stop_flag = {'stopped': False}
+        thread = threading.Thread(
+            target=self.run_job, args=(job["id"], job["srt"], json.loads(job["params"]), stop_flag),
+            name=f"job-{job['id']}", daemon=True
+        )
+        self.running[job["id"]] = (thread, stop_flag, engines)
+        emit({"event": "start", "id": job["id"], "file": job["srt"], "priority": job["priority"]})
+        thread.start()
+
+    def run_job(self, job_id, srt_path, params, stop_flag):
+        """Потік завдання: озвучує файл і кладе результат у self.results"""
+        started = time.time()
+        last_percent = [-1]
+
+        def progress_callback(percent):
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                emit({"event": "progress", "id": job_id, "file": srt_path, "percent": percent})
+
+        def log_callback(message):
+            message = message.strip()
+            if self.verbose and message:
+                emit({"event": "log", "id": job_id, "file": srt_path, "message": message})
+
+        voices = [tuple(voice) for voice in params["voices"]]
+        video_path = main.find_video_for_srt(srt_path) if params["mux_video"] else None
+        try:
+            if params["mux_video"] and video_path is None:
+                raise Exception(f"не знайдено відео ({', '.join(main.VIDEO_EXTENSIONS)}) з назвою {Path(srt_path).stem}")
+            results = main.process_srt_to_voices(
+                srt_path,
+                voices,
+                params["duration_ms"],
+                progress_callback,
+                log_callback,
+                stop_flag,
+                streaming=self.defaults.streaming,
+                disk_timeline=self.defaults.disk_timeline,
+                output_format=params["format"],
+                video_path=video_path,
+                incremental=self.defaults.incremental
+            )
+            error = None if all(results.values()) else "див. лог (--verbose)"
+        except Exception as e:
+            results = {voice_name: False for _, _, voice_name in voices}
+            error = str(e)
+
+        outputs = [
+            str(main.voice_output_path(srt_path, voice_name, params["format"], video_path))
+            for _, _, voice_name in voices if results[voice_name]
+        ]
+        self.results.put((job_id, srt_path, all(results.values()), outputs, error, round(time.time() - started, 2)))
+
+    def collect(self, timeout):
+        """Чекає завершення завдань до timeout секунд; повертає True, якщо щось завершилося"""
+        finished = False
+        try:
+            while True:
+                job_id, srt_path, ok, outputs, error, seconds = self.results.get(timeout=timeout)
+                thread, stop_flag, _ = self.running.pop(job_id)
+                thread.join()
+                if stop_flag['stopped']:
+                    # Перервано зупинкою демона: продовжиться після перезапуску
+                    self.job_queue.requeue(job_id)
+                    emit({"event": "interrupted", "id": job_id, "file": srt_path})
+                else:
+                    self.job_queue.finish(job_id, "done" if ok else "failed", outputs, error)
+                    emit({"event": "done", "id": job_id, "file": srt_path, "ok": ok,
+                          "outputs": outputs, "error": error, "seconds": seconds})
+                finished = True
+                timeout = 0
+        except queue.Empty:
+            return finished
+
+    def write_status(self):
+        """Атомарно перезаписує файл стану черги"""
+        if not self.status_path:
+            return
+        temp_path = f"{self.status_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.job_queue.status(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.status_path)
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, interval):
+        """Головний цикл: перевірка каталогів, запуск завдань, збір результатів"""
+        emit({"event": "daemon", "directories": self.directories, "jobs": self.max_jobs, "limits": self.engine_limits})
+        self.write_status()
+        next_scan = 0
+        while not self.stopping:
+            changed = False
+            if time.time() >= next_scan:
+                changed |= self.scan()
+                next_scan = time.time() + interval
+            changed |= self.schedule()
+            changed |= self.collect(timeout=min(1.0, interval))
+            if changed:
+                self.write_status()
+
+        # Зупинка: перериваємо поточні завдання, вони повернуться в чергу
+        for _, stop_flag, _ in self.running.values():
+            stop_flag['stopped'] = True
+        while self.running:
+            self.collect(timeout=1.0)
+        self.write_status()
+        emit({"event": "stopped"})
+
+def parse_limits(values):
+    """--limit движок=N -> {движок: N} поверх ENGINE_JOB_LIMITS"""
+    limits = dict(ENGINE_JOB_LIMITS)
+    for value in values or []:
+        engine_type, _, count = value.partition("=")
+        if engine_type not in ENGINES or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"некоректний ліміт {value!r}, очікується движок=N")
+        limits[engine_type] = int(count)
+    return limits
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Фонова озвучка нових SRT файлів у каталогах")
+    parser.add_argument("directories", nargs="*", help="Каталоги, за якими стежити")
+    parser.add_argument("--db", default=QUEUE_DB, help=f"Файл черги SQLite (за замовчуванням {QUEUE_DB})")
+    parser.add_argument("--status", help="Куди писати стан черги (JSON)")
+    parser.add_argument("--print-status", action="store_true", help="Вивести стан черги в stdout і вийти")
+    parser.add_argument("--interval", type=float, default=5.0, help="Як часто перевіряти каталоги, с")
+    parser.add_argument("--jobs", type=int, default=4, help="Скільки завдань виконувати одночасно")
+    parser.add_argument("--limit", action="append", metavar="ДВИЖОК=N",
+                        help=f"Скільки завдань движка виконувати одночасно (за замовчуванням {ENGINE_JOB_LIMITS})")
+    parser.add_argument("--engine", choices=ENGINES, default="edge", help="Движок, якщо його не задано у файлі")
+    parser.add_argument("--voice", action="append", help="Голос(и), якщо їх не задано у файлі (як у batch.py)")
+    parser.add_argument("--priority", type=int, default=0, help="Пріоритет, якщо його не задано у файлі")
+    parser.add_argument("--format", choices=list(main.OUTPUT_FORMATS), default=main.OUTPUT_FORMAT)
+    parser.add_argument("--mux-video", action="store_true", help="Вбудовувати озвучку у відео з тією ж назвою")
+    parser.add_argument("--streaming", action="store_true", help="Потокове збирання (менше пам'яті)")
+    parser.add_argument("--disk-timeline", action="store_true", help="Збирати доріжку у тимчасовому файлі на диску")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Змінений SRT переозвучувати лише в змінених субтитрах (доріжка зберігається між запусками)")
+    parser.add_argument("--verbose", action="store_true", help="Також виводити лог обробки")
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.db)
+    if args.print_status:
+        emit(job_queue.status())
+        job_queue.close()
+        return 0
+
+    if not args.directories:
+        parser.error("потрібен хоча б один каталог")
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"каталог не існує: {directory}")
+    try:
+        limits = parse_limits(args.limit)
+        # Перевіряємо голоси за замовчуванням одразу, а не при першому файлі
+        parse_voices(args.voice, args.engine)
+    except ValueError as e:
+        parser.error(str(e))
+
+    job_queue.recover()
+    daemon = WatchDaemon(
+        job_queue, args.directories, args, max(1, args.jobs), limits,
+        status_path=args.status, verbose=args.verbose
+    )
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        daemon.run(args.interval)
+    finally:
+        job_queue.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,16 +1,28 @@
-import pysrt
 import os
 from pathlib import Path
 import asyncio
-import edge_tts
 import subprocess
 import tempfile
 import shutil
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
 import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+import itertools
+import queue
+from collections import deque, OrderedDict, Counter
 import glob
 import json
+import wave
+import io
+import hashlib
+import unicodedata
+import atexit
+import time
+import inspect
+from types import SimpleNamespace
+from contextlib import contextmanager
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 # Конфігурація голосів Edge TTS
 EDGE_VOICES = {
@@ -32,15 +44,97 @@ ESPNET_VOICES = {
     "Олекса (чоловічий)": "Олекса (чоловічий) 👨"
 }
 
+# Скільки субтитрів кожен движок може озвучувати одночасно
+ENGINE_CONCURRENCY = {
+    "edge": 8,
+    "piper": max(1, (os.cpu_count() or 2) // 2),
+    "mms": max(1, int(os.environ.get("MMS_REPLICAS", 0))),
+    "espnet": int(os.environ.get("ESPNET_CONCURRENCY", 2))
+}
+ENGINE_SEMAPHORES = {}
+ENGINE_SEMAPHORES_LOCK = threading.Lock()
+
+# Межі зміни швидкості одного субтитру (поточна тривалість / потрібна)
+STRETCH_MIN_RATIO = 0.5
+STRETCH_MAX_RATIO = 2.0
+
+# Параметри WSOLA: довжина вікна та окіл пошуку найкращого збігу
+WSOLA_FRAME_MS = 30
+WSOLA_TOLERANCE_MS = 8
+
+# Формат внутрішньої аудіодоріжки за замовчуванням, на яку накладаються всі
+# субтитри (завдання може задати свій). Вихід кожного движка переводиться
+# в нього один раз, одразу після озвучки
+TIMELINE_SAMPLE_RATE = 44100
+TIMELINE_CHANNELS = 2
+# Каталог тимчасових файлів доріжки на диску (None - системний тимчасовий)
+TIMELINE_SCRATCH_DIR = os.environ.get("SRT_VOICE_SCRATCH") or None
+
+# Формати вихідного файлу: розширення і параметри кодека FFmpeg. Готова доріжка
+# кодується в обраний формат один раз, без проміжних файлів
+OUTPUT_FORMATS = {
+    "mp3": {"extension": ".mp3", "codec": ['-codec:a', 'libmp3lame', '-qscale:a', '2']},
+    "opus": {"extension": ".opus", "codec": ['-codec:a', 'libopus', '-b:a', '128k']},
+    "aac": {"extension": ".m4a", "codec": ['-codec:a', 'aac', '-b:a', '192k']},
+    "flac": {"extension": ".flac", "codec": ['-codec:a', 'flac']},
+    "wav": {"extension": ".wav", "codec": ['-codec:a', 'pcm_s16le']}
+}
+OUTPUT_FORMAT = "mp3"
+# Додаткові параметри кодека, щоб у готовому файлі можна було перекодувати лише
+# частину (інкрементальна переозвучка): MP3 без бітового резервуару, тоді кожен
+# кадр не залежить від байтів попередніх
+SPLICE_CODEC_ARGS = {"mp3": ['-reservoir', '0']}
+# Змінені ділянки доріжки, ближчі одна до одної за стільки секунд, перекодовуються разом
+INCREMENTAL_MERGE_GAP_S = 5
+# Відео, яке шукається поруч із SRT для вбудовування озвучки
+VIDEO_EXTENSIONS = [".mp4", ".mkv", ".mov", ".avi", ".webm"]
+
 # Глобальна змінна для MMS моделі (завантажується один раз)
 MMS_MODEL = None
 MMS_PROCESSOR = None
+MMS_LOCK = threading.Lock()
+
+# Пакетна озвучка MMS: скільки фраз в одному forward та скільки субтитрів
+# сортуються за довжиною разом (більше вікно - менше доповнення, але пізніше
+# з'являється перший готовий субтитр)
+MMS_BATCH_SIZE = 8
+MMS_BATCH_WINDOW = 64
+
+# Виконання MMS: "eager" (transformers + torch), "onnx" або "onnx-int8".
+# ONNX модель експортується один раз, кешується в MMS_ONNX_DIR і виконується
+# через onnxruntime без імпорту torch
+MMS_MODEL_ID = "facebook/mms-tts-ukr"
+MMS_BACKEND = os.environ.get("MMS_BACKEND", "eager")
+MMS_ONNX_DIR = "mms_onnx"
+# Динамічна int8 квантизація лише матричних множень: згортки в int8
+# (ConvInteger) на CPU виконуються повільніше за float
+MMS_QUANTIZE_OPS = ["MatMul", "Gemm"]
+# Перевірка експортованої моделі проти eager (без шуму, тобто детерміновано):
+# відхилення тривалості та середня спектральна відстань
+MMS_ONNX_CHECK_TEXTS = [
+    "Привіт! Це перевірка озвучки.",
+    "Сьогодні ввечері в місті очікується дощ і сильний вітер.",
+    "Він відчинив двері, озирнувся і тихо сказав: ходімо."
+]
+MMS_ONNX_MAX_LENGTH_ERROR = 0.05
+MMS_ONNX_MAX_SPECTRAL_DB = 6.0
+
+# Пул процесів-реплік MMS (0 - одна модель у цьому процесі) і кількість
+# потоків torch/onnxruntime на репліку. На N ядрах зазвичай найкраще
+# MMS_REPLICAS = N / MMS_REPLICA_THREADS
+MMS_REPLICAS = int(os.environ.get("MMS_REPLICAS", 0))
+MMS_REPLICA_THREADS = int(os.environ.get("MMS_REPLICA_THREADS", 1))
 
 # Пошук Piper моделей
+PIPER_VOICES_DIR = "piper_voices"
+# Індекс знайдених моделей, щоб не сканувати piper_voices при кожному запуску.
+# Лежить поза piper_voices: запис у саму папку змінив би її mtime
+PIPER_INDEX_FILE = "piper_voices_index.json"
+
 def find_piper_models():
     """Знаходить завантажені моделі Piper з інформацією про спікерів"""
     models = {}
-    voices_dir = "piper_voices"
+    voices_dir = PIPER_VOICES_DIR
     
     if os.path.exists(voices_dir):
         onnx_files = glob.glob(os.path.join(voices_dir, "**", "*.onnx"), recursive=True)
@@ -72,11 +166,227 @@ def find_piper_models():
     
     return models
 
-PIPER_MODELS = find_piper_models()
+def scan_piper_dirs():
+    """mtime усіх каталогів piper_voices: нова модель змінює mtime свого батьківського каталогу"""
+    if not os.path.isdir(PIPER_VOICES_DIR):
+        return {PIPER_VOICES_DIR: None}
+    dirs = {}
+    for root, _, _ in os.walk(PIPER_VOICES_DIR, followlinks=True):
+        dirs[root] = os.stat(root).st_mtime
+    return dirs
+
+def piper_index_is_fresh(dirs):
+    """Чи не змінилися каталоги з моменту побудови індексу (лише stat, без обходу)"""
+    for path, mtime in dirs.items():
+        try:
+            current = os.stat(path).st_mtime
+        except OSError:
+            current = None
+        if current != mtime:
+            return False
+    return True
+
+def read_piper_index():
+    """Читає індекс моделей або повертає None"""
+    try:
+        with open(PIPER_INDEX_FILE, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        return index if "dirs" in index and "models" in index else None
+    except (OSError, ValueError):
+        return None
+
+def rebuild_piper_index():
+    """Сканує piper_voices і перезаписує індекс"""
+    index = {"dirs": scan_piper_dirs(), "models": find_piper_models()}
+    try:
+        temp_path = f"{PIPER_INDEX_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, PIPER_INDEX_FILE)
+    except OSError:
+        # Індекс - лише прискорення, без нього теж працюємо
+        pass
+    return index
+
+def load_piper_models(refresh=True):
+    """Заповнює PIPER_MODELS з індексу; повертає True, якщо список моделей змінився.
+    
+    refresh=False довіряє індексу без перевірки (для швидкого старту вікна,
+    перевірка тоді йде у фоні); refresh=True спершу звіряє mtime каталогів.
+    Новий словник підставляється цілим, тож ті, хто вже отримав попередній
+    через get_piper_models, читають його без блокування.
+    """
+    global PIPER_MODELS, PIPER_MODELS_LOADED
+    index = read_piper_index()
+    if index is None or (refresh and not piper_index_is_fresh(index["dirs"])):
+        index = rebuild_piper_index()
+    with PIPER_MODELS_LOCK:
+        changed = index["models"] != PIPER_MODELS
+        PIPER_MODELS = dict(index["models"])
+        PIPER_MODELS_LOADED = True
+    return changed
+
+def get_piper_models():
+    """Знайдені Piper моделі: назва -> {"model", "config", "speaker"}"""
+    if not PIPER_MODELS_LOADED:
+        load_piper_models()
+    return PIPER_MODELS
+
+PIPER_MODELS = {}
+PIPER_MODELS_LOADED = False
+PIPER_MODELS_LOCK = threading.Lock()
+
+# Кеш озвученого аудіо на диску
+SYNTHESIS_CACHE_DIR = "tts_cache"
+SYNTHESIS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+SYNTHESIS_CACHE = None
+SYNTHESIS_CACHE_LOCK = threading.Lock()
+
+# Трасування етапів обробки: Tracer поточного запуску (None - вимкнено) і каталог для трас.
+# Кожен запуск задає свій Tracer у власному контексті, тож одночасні запуски в одному
+# процесі (голоси, завдання daemon.py) не змішують траси; робочі потоки отримують копію контексту
+TRACER = contextvars.ContextVar("tracer", default=None)
+TRACE_DIR = os.environ.get("SRT_VOICE_TRACE")
+
+# Каталоги завдань: готові субтитри переживають зупинку чи збій програми
+JOBS_DIR = "tts_jobs"
+
+# Хеші файлів моделей: (шлях, розмір, mtime) -> sha256
+MODEL_HASHES = {}
+MODEL_HASHES_LOCK = threading.Lock()
+
+# Спільний Edge TTS движок (створюється при першому використанні)
+EDGE_ENGINE = None
+EDGE_ENGINE_LOCK = threading.Lock()
+
+# Спільний клієнт UA-ESPNET: Space на HuggingFace і повтори при тимчасових збоях
+ESPNET_SPACE = "robinhad/ukrainian-tts"
+ESPNET_RETRIES = 4
+ESPNET_BACKOFF = 1.0
+ESPNET_ENGINE = None
+ESPNET_ENGINE_LOCK = threading.Lock()
+
+# Завантажені Piper моделі: шлях до .onnx -> PiperEngine
+PIPER_ENGINES = {}
+PIPER_ENGINES_LOCK = threading.Lock()
+
+# Фонове прогрівання обраного голосу і зразок для прослуховування
+PREVIEW_TEXT = "Привіт! Це приклад озвучки. Так звучатиме ваш текст."
+WARMUP_SERVICE = None
+WARMUP_SERVICE_LOCK = threading.Lock()
+
+class Tracer:
+    """Збирає інтервали (spans) етапів обробки з усіх потоків.
+    
+    Кожен інтервал - назва етапу, початок і кінець (time.perf_counter), потік і
+    довільні атрибути: номер субтитру, довжина тексту, тривалість аудіо тощо.
+    Експортується у формат Chrome trace (chrome://tracing, Perfetto) і в
+    підсумкову таблицю по етапах.
+    """
+    
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.threads = {}
+        self.lock = threading.Lock()
+    
+    def record(self, name, start, end, args):
+        """Додає завершений інтервал"""
+        thread = threading.current_thread()
+        with self.lock:
+            if thread.ident not in self.threads:
+                self.threads[thread.ident] = (len(self.threads) + 1, thread.name)
+            self.spans.append({
+                "name": name,
+                "start": start,
+                "end": end,
+                "tid": self.threads[thread.ident][0],
+                "args": args
+            })
+    
+    def export_chrome(self, path):
+        """Зберігає трасу у форматі Chrome trace-event JSON"""
+        pid = os.getpid()
+        with self.lock:
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self.threads.values()
+            ]
+            for span in self.spans:
+                events.append({
+                    "name": span["name"],
+                    "cat": span["name"].split(".")[0],
+                    "ph": "X",
+                    "ts": round((span["start"] - self.origin) * 1e6, 1),
+                    "dur": round((span["end"] - span["start"]) * 1e6, 1),
+                    "pid": pid,
+                    "tid": span["tid"],
+                    "args": span["args"]
+                })
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    
+    def summary(self):
+        """Підсумок по етапах: [(етап, кількість, сумарно с, середнє мс, максимум мс)], найдовші першими"""
+        totals = {}
+        with self.lock:
+            for span in self.spans:
+                count, total, longest = totals.get(span["name"], (0, 0.0, 0.0))
+                duration = span["end"] - span["start"]
+                totals[span["name"]] = (count + 1, total + duration, max(longest, duration))
+        rows = [
+            (name, count, total, total / count * 1000, longest * 1000)
+            for name, (count, total, longest) in totals.items()
+        ]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+    
+    def format_summary(self):
+        """Підсумкова таблиця як текст"""
+        lines = [f"{'Етап':<18}{'Разів':>7}{'Всього, с':>12}{'Середнє, мс':>14}{'Макс, мс':>12}"]
+        for name, count, total, mean, longest in self.summary():
+            lines.append(f"{name:<18}{count:>7}{total:>12.2f}{mean:>14.1f}{longest:>12.1f}")
+        return "\n".join(lines) + "\n"
+
+@contextmanager
+def trace_span(name, **args):
+    """Вимірює етап, якщо трасування увімкнене; атрибути можна доповнити через отриманий dict"""
+    tracer = TRACER.get()
+    if tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        tracer.record(name, start, time.perf_counter(), args)
+
+def get_voice_names(engine_type):
+    """Назви голосів, доступних для движка"""
+    if engine_type == "edge":
+        return list(EDGE_VOICES.keys())
+    if engine_type == "piper":
+        return list(get_piper_models().keys())
+    if engine_type == "mms":
+        return list(MMS_VOICE.keys())
+    if engine_type == "espnet":
+        return list(ESPNET_VOICES.keys())
+    return []
+
+def get_voice_id(engine_type, voice_name):
+    """Ідентифікатор голосу для движка за назвою з інтерфейсу"""
+    if engine_type == "edge":
+        return EDGE_VOICES[voice_name]
+    if engine_type == "mms":
+        return MMS_VOICE[voice_name]
+    if engine_type == "espnet":
+        return ESPNET_VOICES[voice_name]
+    return voice_name
 
 def parse_srt_file(srt_path):
     """Читає SRT файл та повертає список субтитрів"""
     try:
+        import pysrt
         subs = pysrt.open(srt_path, encoding='utf-8')
         return subs
     except Exception as e:
@@ -89,493 +399,2741 @@ def get_timing_info(subtitle):
                subtitle.start.seconds * 1000 + \
                subtitle.start.milliseconds
     
-    end_ms = subtitle.end.hours * 3600000 + \
-             subtitle.end.minutes * 60000 + \
-             subtitle.end.seconds * 1000 + \
-             subtitle.end.milliseconds
+    end_ms = subtitle.end.hours * 3600000 + \
+             subtitle.end.minutes * 60000 + \
+             subtitle.end.seconds * 1000 + \
+             subtitle.end.milliseconds
+    
+    duration_ms = end_ms - start_ms
+    
+    return start_ms, end_ms, duration_ms
+
+def get_last_subtitle_end_time(subs):
+    """Отримує час закінчення останнього субтитру"""
+    if not subs:
+        return 0
+    last_sub = subs[-1]
+    _, end_ms, _ = get_timing_info(last_sub)
+    return end_ms
+
+class EdgeTTSEngine:
+    """Edge TTS на одному постійному asyncio циклі у фоновому потоці.
+    
+    Запити з будь-яких потоків виконуються на цьому циклі, одночасно не більше
+    max_concurrency. Аудіо збирається з Communicate.stream() прямо в пам'ять.
+    base_url дозволяє підключитися до локальної заглушки (stub_servers.py).
+    """
+    
+    def __init__(self, max_concurrency=None, base_url=None):
+        import edge_tts
+        self.edge_tts = edge_tts
+        if base_url:
+            # edge_tts не має параметра для адреси сервісу, тому підміняємо константу модуля
+            edge_tts.communicate.WSS_URL = base_url
+        self.semaphore = asyncio.Semaphore(max_concurrency or ENGINE_CONCURRENCY["edge"])
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="edge-tts-loop", daemon=True)
+        self.thread.start()
+    
+    async def _synthesize(self, text, voice):
+        async with self.semaphore:
+            communicate = self.edge_tts.Communicate(text, voice)
+            chunks = []
+            async for message in communicate.stream():
+                if message["type"] == "audio":
+                    chunks.append(message["data"])
+        return b"".join(chunks)
+    
+    def synthesize(self, text, voice):
+        """Озвучує текст і повертає MP3 байти (блокує викликаючий потік)"""
+        try:
+            return asyncio.run_coroutine_threadsafe(self._synthesize(text, voice), self.loop).result()
+        except Exception as e:
+            raise Exception(f"Edge TTS помилка: {e}")
+    
+    def close(self):
+        """Зупиняє фоновий цикл"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+def get_edge_engine():
+    """Повертає спільний Edge TTS движок, створюючи його при першому виклику"""
+    global EDGE_ENGINE
+    with EDGE_ENGINE_LOCK:
+        if EDGE_ENGINE is None:
+            EDGE_ENGINE = EdgeTTSEngine(base_url=os.environ.get("EDGE_TTS_URL"))
+        return EDGE_ENGINE
+
+def find_piper_exe():
+    """Шукає piper.exe у стандартних місцях"""
+    possible_paths = [
+        "piper\\piper.exe",
+        "C:\\piper\\piper.exe",
+        os.path.expanduser("~\\piper\\piper.exe")
+    ]
+    
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+class PiperEngine:
+    """Довгоживучий Piper: модель завантажується один раз на весь сеанс.
+    
+    Якщо встановлено пакет piper-tts, ONNX модель виконується прямо в процесі
+    через onnxruntime. Інакше запускається один piper.exe на модель, який
+    читає запити з stdin (--json-input) і не перезавантажує модель між ними.
+    """
+    
+    def __init__(self, model_path, config_path):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.voice = None
+        self.process = None
+        self.output_dir = None
+        # espeak-ng та pipe до piper.exe не потокобезпечні
+        self.lock = threading.Lock()
+        
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self.sample_rate = config.get('audio', {}).get('sample_rate', 22050)
+        
+        try:
+            from piper.voice import PiperVoice
+            self.voice = PiperVoice.load(model_path, config_path)
+        except ImportError:
+            self._start_worker()
+    
+    def _start_worker(self):
+        """Запускає постійний процес piper.exe для цієї моделі"""
+        piper_exe = find_piper_exe()
+        if not piper_exe:
+            raise Exception("Piper.exe не знайдено! Встановіть Piper у папку 'piper' або 'C:\\piper'")
+        
+        self.output_dir = tempfile.mkdtemp(prefix="piper_")
+        cmd = [
+            piper_exe,
+            '--model', self.model_path,
+            '--config', self.config_path,
+            '--json-input',
+            '--output_dir', self.output_dir
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+    
+    def synthesize(self, text, speaker_id=None):
+        """Озвучує текст і повертає (PCM float32 моно, частота дискретизації)"""
+        if self.voice is not None:
+            return self._synthesize_in_process(text, speaker_id), self.sample_rate
+        return self._synthesize_with_worker(text, speaker_id), self.sample_rate
+    
+    def _synthesize_in_process(self, text, speaker_id):
+        with self.lock:
+            sentences = self.voice.phonemize(text)
+        
+        chunks = []
+        for phonemes in sentences:
+            phoneme_ids = self.voice.phonemes_to_ids(phonemes)
+            audio_bytes = self.voice.synthesize_ids_to_raw(phoneme_ids, speaker_id=speaker_id)
+            chunks.append(np.frombuffer(audio_bytes, dtype=np.int16))
+        
+        if not chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(chunks).astype(np.float32) / 32768.0
+    
+    def _synthesize_with_worker(self, text, speaker_id):
+        request = {"text": text}
+        if speaker_id is not None:
+            request["speaker_id"] = speaker_id
+        
+        with self.lock:
+            if self.process.poll() is not None:
+                raise Exception("процес piper.exe завершився несподівано")
+            self.process.stdin.write((json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.process.stdin.flush()
+            # Piper друкує шлях до готового WAV після кожного рядка
+            wav_path = self.process.stdout.readline().decode('utf-8').strip()
+        
+        if not wav_path or not os.path.exists(wav_path):
+            raise Exception("Piper не створив аудіофайл")
+        
+        try:
+            with wave.open(wav_path, 'rb') as wav_file:
+                frames = wav_file.readframes(wav_file.getnframes())
+        finally:
+            os.remove(wav_path)
+        return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    
+    def close(self):
+        """Зупиняє piper.exe та прибирає його тимчасову папку"""
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+            self.process = None
+        if self.output_dir:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            self.output_dir = None
+
+def get_piper_engine(model_path, config_path):
+    """Повертає завантажений Piper для моделі, створюючи його при першому виклику"""
+    with PIPER_ENGINES_LOCK:
+        engine = PIPER_ENGINES.get(model_path)
+        if engine is None:
+            engine = PiperEngine(model_path, config_path)
+            PIPER_ENGINES[model_path] = engine
+        return engine
+
+def close_piper_engines():
+    """Закриває всі завантажені Piper моделі"""
+    with PIPER_ENGINES_LOCK:
+        for engine in PIPER_ENGINES.values():
+            engine.close()
+        PIPER_ENGINES.clear()
+
+atexit.register(close_piper_engines)
+
+def load_mms_model():
+    """Завантажує MMS модель один раз на весь сеанс.
+    
+    Виконання задає MMS_BACKEND; якщо MMS_REPLICAS > 0, замість моделі
+    повертається пул процесів-реплік (MmsReplicaPool).
+    """
+    global MMS_MODEL, MMS_PROCESSOR
+    with MMS_LOCK:
+        if MMS_MODEL is None:
+            with trace_span("load.mms", backend=MMS_BACKEND, replicas=MMS_REPLICAS):
+                if MMS_BACKEND == "eager":
+                    model, processor = load_mms_eager_model()
+                else:
+                    model, processor = load_mms_onnx_model(quantize=MMS_BACKEND == "onnx-int8")
+                if MMS_REPLICAS > 0:
+                    model = MmsReplicaPool(model, processor, MMS_REPLICAS, MMS_REPLICA_THREADS)
+                MMS_MODEL, MMS_PROCESSOR = model, processor
+        return MMS_MODEL, MMS_PROCESSOR
+
+def unload_mms_model():
+    """Вивантажує MMS модель (і зупиняє пул реплік)"""
+    global MMS_MODEL, MMS_PROCESSOR
+    with MMS_LOCK:
+        if isinstance(MMS_MODEL, MmsReplicaPool):
+            MMS_MODEL.close()
+        MMS_MODEL = MMS_PROCESSOR = None
+
+atexit.register(unload_mms_model)
+
+def load_mms_eager_model():
+    """MMS через transformers: (VitsModel, токенізатор)"""
+    from transformers import VitsModel, AutoTokenizer
+    model = VitsModel.from_pretrained(MMS_MODEL_ID).eval()
+    return model, AutoTokenizer.from_pretrained(MMS_MODEL_ID)
+
+class MmsOnnxModel:
+    """MMS (VITS), експортований в ONNX, на onnxruntime.
+    
+    Для mms_tts_synthesize_batch виглядає як VitsModel: має config.sampling_rate,
+    а виклик повертає (waveform, sequence_lengths), тільки numpy і без torch.
+    """
+    
+    def __init__(self, model_path, meta, threads=None):
+        import onnxruntime
+        self.model_path = model_path
+        self.meta = meta
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        # Вхід шуму, який модель не використовує, експортер викидає
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.config = SimpleNamespace(sampling_rate=meta["sampling_rate"])
+        self.noise_scale = meta["noise_scale"]
+        self.noise_scale_duration = meta["noise_scale_duration"]
+        self.min_tokens = meta["min_tokens"]
+    
+    def __call__(self, input_ids, attention_mask, noise_scale=None, noise_scale_duration=None):
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        attention_mask = np.asarray(attention_mask, dtype=np.int64)
+        # Відносні позиції уваги експортовані для довжин, більших за вікно;
+        # коротші входи доповнюються (доповнення маскується)
+        if input_ids.shape[1] < self.min_tokens:
+            pad = ((0, 0), (0, self.min_tokens - input_ids.shape[1]))
+            input_ids = np.pad(input_ids, pad)
+            attention_mask = np.pad(attention_mask, pad)
+        feed = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "noise_scale": np.array(self.noise_scale if noise_scale is None else noise_scale, dtype=np.float32),
+            "noise_scale_duration": np.array(
+                self.noise_scale_duration if noise_scale_duration is None else noise_scale_duration, dtype=np.float32
+            )
+        }
+        waveform, sequence_lengths = self.session.run(
+            ["waveform", "sequence_lengths"], {name: value for name, value in feed.items() if name in self.input_names}
+        )
+        return waveform, sequence_lengths
+
+def mms_onnx_dir():
+    return os.path.join(MMS_ONNX_DIR, MMS_MODEL_ID.replace("/", "--"))
+
+def load_mms_onnx_model(quantize=False):
+    """MMS через onnxruntime: (MmsOnnxModel, токенізатор). При першому запуску модель експортується"""
+    artifact_dir = mms_onnx_dir()
+    name = "model.int8.onnx" if quantize else "model.onnx"
+    meta_path = os.path.join(artifact_dir, "meta.json")
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    if meta is None or name not in meta["variants"] or not os.path.exists(os.path.join(artifact_dir, name)):
+        meta = export_mms_onnx(quantize)
+    
+    quality = meta["variants"][name]["quality"]
+    if not quality["passed"]:
+        raise Exception(
+            f"MMS {name} не пройшла перевірку якості (тривалість ±{quality['length_error']:.1%}, "
+            f"спектр {quality['spectral_db']:.1f} дБ); використайте MMS_BACKEND=eager"
+        )
+    
+    # Токенізатор MMS посимвольний і не потребує torch
+    from transformers import VitsTokenizer
+    return MmsOnnxModel(os.path.join(artifact_dir, name), meta), VitsTokenizer.from_pretrained(artifact_dir)
+
+def mms_model_hash(voice_id):
+    """Ідентифікатор виконання MMS для ключа кешу: бекенд і хеш ONNX артефакту.
+    
+    Eager модель однозначно задається назвою на HuggingFace. ONNX артефакт, якого
+    ще немає або який не пройшов перевірку якості, спершу готується через
+    load_mms_model (там же перевірка зупиняє непридатну модель).
+    """
+    if MMS_BACKEND == "eager":
+        return f"{voice_id}:eager"
+    name = "model.int8.onnx" if MMS_BACKEND == "onnx-int8" else "model.onnx"
+    path = os.path.join(mms_onnx_dir(), name)
+    meta_path = os.path.join(mms_onnx_dir(), "meta.json")
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    if meta is None or not os.path.exists(path) or not meta["variants"].get(name, {}).get("quality", {}).get("passed"):
+        load_mms_model()
+    return f"{voice_id}:{MMS_BACKEND}:{file_hash(path)}"
+
+def export_mms_onnx(quantize=False):
+    """Експортує MMS в ONNX (і за потреби квантує в int8), перевіряє проти eager, повертає meta"""
+    import torch
+    
+    class ExportWrapper(torch.nn.Module):
+        """Робить шум VITS входами графа, щоб перевірку можна було провести без шуму"""
+        
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+        
+        def forward(self, input_ids, attention_mask, noise_scale, noise_scale_duration):
+            self.model.noise_scale = noise_scale
+            self.model.noise_scale_duration = noise_scale_duration
+            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+            return outputs.waveform, outputs.sequence_lengths
+    
+    artifact_dir = mms_onnx_dir()
+    os.makedirs(artifact_dir, exist_ok=True)
+    model, processor = load_mms_eager_model()
+    meta_path = os.path.join(artifact_dir, "meta.json")
+    meta = {
+        "model": MMS_MODEL_ID,
+        "sampling_rate": model.config.sampling_rate,
+        "noise_scale": model.config.noise_scale,
+        "noise_scale_duration": model.config.noise_scale_duration,
+        "min_tokens": (model.config.window_size or 0) + 2,
+        "variants": {}
+    }
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta["variants"] = json.load(f).get("variants", {})
+    
+    fp32_path = os.path.join(artifact_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        inputs = processor(text=MMS_ONNX_CHECK_TEXTS[:2], return_tensors="pt", padding=True)
+        args = (
+            inputs["input_ids"], inputs["attention_mask"],
+            torch.tensor(meta["noise_scale"]), torch.tensor(meta["noise_scale_duration"])
+        )
+        options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # Новіші torch за замовчуванням експортують через dynamo, VITS - лише трасуванням
+            options["dynamo"] = False
+        temp_path = f"{fp32_path}.tmp"
+        torch.onnx.export(
+            ExportWrapper(model), args, temp_path,
+            input_names=["input_ids", "attention_mask", "noise_scale", "noise_scale_duration"],
+            output_names=["waveform", "sequence_lengths"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "tokens"},
+                "attention_mask": {0: "batch", 1: "tokens"},
+                "waveform": {0: "batch", 1: "samples"},
+                "sequence_lengths": {0: "batch"}
+            },
+            opset_version=17,
+            **options
+        )
+        os.replace(temp_path, fp32_path)
+        # Експорт міг перемкнути модель у режим навчання і лишити шум тензорами
+        model.eval()
+        model.noise_scale = meta["noise_scale"]
+        model.noise_scale_duration = meta["noise_scale_duration"]
+    
+    name, path = "model.onnx", fp32_path
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        name, path = "model.int8.onnx", os.path.join(artifact_dir, "model.int8.onnx")
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8, op_types_to_quantize=MMS_QUANTIZE_OPS)
+    
+    quality = check_mms_onnx(model, processor, MmsOnnxModel(path, meta))
+    meta["variants"][name] = {"quality": quality, "size_mb": round(os.path.getsize(path) / (1024 * 1024), 1)}
+    processor.save_pretrained(artifact_dir)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+def log_spectrogram(pcm, frame=1024, hop=256):
+    """Логарифмічний амплітудний спектр (дБ) по кадрах з вікном Ганна"""
+    if len(pcm) < frame:
+        pcm = np.pad(pcm, (0, frame - len(pcm)))
+    frames = sliding_window_view(pcm, frame)[::hop] * np.hanning(frame)
+    return 20 * np.log10(np.abs(np.fft.rfft(frames, axis=1)) + 1e-5)
+
+def check_mms_onnx(model, processor, onnx_model):
+    """Порівнює ONNX модель з eager на MMS_ONNX_CHECK_TEXTS без шуму"""
+    import torch
+    
+    length_error = spectral_db = 0.0
+    saved = model.noise_scale, model.noise_scale_duration
+    model.noise_scale = model.noise_scale_duration = 0.0
+    try:
+        for text in MMS_ONNX_CHECK_TEXTS:
+            inputs = processor(text=text, return_tensors="pt")
+            with torch.no_grad():
+                outputs = model(**inputs)
+            reference = outputs.waveform[0, :int(outputs.sequence_lengths[0])].numpy()
+            waveform, lengths = onnx_model(inputs["input_ids"].numpy(), inputs["attention_mask"].numpy(), 0.0, 0.0)
+            candidate = waveform[0, :int(lengths[0])]
+            
+            length_error = max(length_error, abs(len(candidate) - len(reference)) / max(len(reference), 1))
+            size = min(len(candidate), len(reference))
+            difference = log_spectrogram(candidate[:size]) - log_spectrogram(reference[:size])
+            spectral_db = max(spectral_db, float(np.mean(np.sqrt(np.mean(difference ** 2, axis=1)))))
+    finally:
+        model.noise_scale, model.noise_scale_duration = saved
+    
+    return {
+        "length_error": round(length_error, 4),
+        "spectral_db": round(spectral_db, 3),
+        "passed": length_error <= MMS_ONNX_MAX_LENGTH_ERROR and spectral_db <= MMS_ONNX_MAX_SPECTRAL_DB
+    }
+
+class MmsReplicaPool:
+    """Кілька процесів-реплік MMS, щоб озвучка не впиралась у GIL і один пул потоків.
+    
+    Ваги eager моделі переносяться у спільну пам'ять (share_memory_), і репліки
+    отримують їх без копіювання; ONNX репліки відкривають той самий файл моделі.
+    Кожна репліка працює на threads потоках. Пакети текстів ідуть у спільну
+    чергу, і їх бере перша вільна репліка.
+    """
+    
+    def __init__(self, model, processor, replicas, threads=1):
+        if isinstance(model, MmsOnnxModel):
+            import multiprocessing
+            context = multiprocessing.get_context("spawn")
+            payload = ("onnx", model.model_path, model.meta)
+        else:
+            # torch.multiprocessing передає тензори через спільну пам'ять. Модуль з
+            # weight norm не серіалізується, тому передаються конфігурація і ваги
+            import torch.multiprocessing
+            context = torch.multiprocessing.get_context("spawn")
+            state = {name: tensor.share_memory_() for name, tensor in model.state_dict().items()}
+            payload = ("eager", model.config, state)
+        self.config = model.config
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        # номер пакета -> Future
+        self.futures = {}
+        self.task_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.processes = [
+            context.Process(
+                target=mms_replica_main, args=(payload, processor, threads, self.tasks, self.results),
+                name=f"mms-replica-{n}", daemon=True
+            )
+            for n in range(replicas)
+        ]
+        for process in self.processes:
+            process.start()
+        self._wait_ready()
+        self.collector = threading.Thread(target=self._collect, name="mms-pool-results", daemon=True)
+        self.collector.start()
+    
+    def _wait_ready(self):
+        """Чекає, поки всі репліки завантажать модель, щоб це не лягло на перший пакет"""
+        ready = 0
+        while ready < len(self.processes):
+            try:
+                _, _, error = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if all(process.is_alive() for process in self.processes):
+                    continue
+                error = "процес завершився під час запуску"
+            if error is not None:
+                self.close()
+                raise Exception(f"репліка MMS не запустилась: {error}")
+            ready += 1
+    
+    def submit(self, texts):
+        """Ставить пакет текстів у чергу: Future зі списком waveform (вже обрізаних)"""
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise Exception("пул MMS зупинено")
+            task_id = next(self.task_ids)
+            self.futures[task_id] = future
+        self.tasks.put((task_id, list(texts)))
+        return future
+    
+    def _collect(self):
+        """Розносить результати реплік по Future; якщо репліка впала, завершує все з помилкою"""
+        while True:
+            try:
+                result = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if self.closed:
+                    return
+                dead = [process.name for process in self.processes if not process.is_alive()]
+                if dead:
+                    self._fail_all(Exception(f"процес {dead[0]} завершився несподівано"))
+                    return
+                continue
+            if result is None:
+                return
+            task_id, waveforms, error = result
+            with self.lock:
+                future = self.futures.pop(task_id, None)
+            if future is None or future.done():
+                # Завдання вже завершене з помилкою в _fail_all (close або збій репліки)
+                continue
+            if error is None:
+                future.set_result(waveforms)
+            else:
+                future.set_exception(Exception(error))
+    
+    def _fail_all(self, error):
+        with self.lock:
+            self.closed = True
+            futures, self.futures = list(self.futures.values()), {}
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+    
+    def close(self):
+        """Зупиняє репліки"""
+        with self.lock:
+            self.closed = True
+            processes, self.processes = self.processes, []
+        for _ in processes:
+            self.tasks.put(None)
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+        self.results.put(None)
+        self._fail_all(Exception("пул MMS зупинено"))
+
+def mms_replica_main(payload, processor, threads, tasks, results):
+    """Процес-репліка MMS: бере пакети текстів з tasks, кладе waveform у results.
+    
+    Першим повідомленням (None, pid, помилка) репліка повідомляє, що готова.
+    """
+    try:
+        if payload[0] == "onnx":
+            model = MmsOnnxModel(payload[1], payload[2], threads=threads)
+        else:
+            import torch
+            from transformers import VitsModel
+            torch.set_num_threads(threads)
+            # Модель без власних ваг (meta), параметри - тензори зі спільної пам'яті
+            with torch.device("meta"):
+                model = VitsModel(payload[1])
+            model.load_state_dict(payload[2], assign=True)
+            model.eval()
+    except Exception as e:
+        results.put((None, os.getpid(), str(e)))
+        return
+    results.put((None, os.getpid(), None))
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, texts = task
+        try:
+            waveform, sequence_lengths = mms_forward(model, processor, texts)
+            waveforms = [waveform[row, :int(sequence_lengths[row])].astype(np.float32) for row in range(len(texts))]
+            results.put((task_id, waveforms, None))
+        except Exception as e:
+            results.put((task_id, None, str(e)))
+
+def mms_forward(model, processor, texts):
+    """Один forward пакета текстів: (waveform (пакет, семпли), sequence_lengths) як numpy"""
+    if isinstance(model, MmsOnnxModel):
+        inputs = processor(text=texts, return_tensors="np", padding=True)
+        return model(inputs["input_ids"], inputs["attention_mask"])
+    
+    import torch
+    inputs = processor(text=texts, return_tensors="pt", padding=True)
+    with torch.no_grad():
+        outputs = model(**inputs)
+    return outputs.waveform.cpu().numpy(), outputs.sequence_lengths.cpu().numpy()
+
+def mms_tts_synthesize_batch(texts, model=None, processor=None, batch_size=None):
+    """Озвучує список текстів через MMS пакетами, повертає waveform для кожного в тому ж порядку.
+    
+    Тексти сортуються за кількістю токенів, щоб у пакеті було мінімум доповнення,
+    і кожен пакет проходить через модель одним forward. Зайві семпли в кінці
+    кожного елемента відрізаються за sequence_lengths моделі.
+    """
+    try:
+        if model is None or processor is None:
+            model, processor = load_mms_model()
+        if batch_size is None:
+            batch_size = MMS_BATCH_SIZE
+        
+        token_lengths = [len(processor(text=text)["input_ids"]) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: token_lengths[i])
+        waveforms = [None] * len(texts)
+        
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+        
+        if isinstance(model, MmsReplicaPool):
+            # Усі пакети одразу в чергу пулу - репліки обробляють їх паралельно
+            futures = [model.submit([texts[i] for i in batch]) for batch in batches]
+            for batch, future in zip(batches, futures):
+                for i, waveform in zip(batch, future.result()):
+                    waveforms[i] = waveform
+            return waveforms
+        
+        for batch in batches:
+            waveform, sequence_lengths = mms_forward(model, processor, [texts[i] for i in batch])
+            
+            for row, i in enumerate(batch):
+                length = int(sequence_lengths[row])
+                waveforms[i] = waveform[row, :length].astype(np.float32)
+        
+        return waveforms
+    except Exception as e:
+        raise Exception(f"MMS TTS помилка: {e}")
+
+class EspnetEngine:
+    """Клієнт UA-ESPNET (Gradio Space), один на всю програму.
+    
+    gradio_client.Client створюється один раз (рукостискання і завантаження
+    конфігурації - лише при першому запиті), запити з різних потоків ідуть
+    паралельно, не більше max_concurrency. Тимчасові збої (черга переповнена,
+    обрив з'єднання, тайм-аут, HTTP 5xx/429) повторюються з експоненційною
+    затримкою, решта помилок (некоректний запит, помилка застосунку Space)
+    одразу піднімаються. Клієнт створюється заново лише після збою з'єднання.
+    base_url дозволяє підключитися до локальної заглушки (stub_servers.py).
+    """
+    
+    def __init__(self, base_url=None, max_concurrency=None, retries=None, backoff=None):
+        self.src = base_url or ESPNET_SPACE
+        self.max_concurrency = max_concurrency or ENGINE_CONCURRENCY["espnet"]
+        self.retries = ESPNET_RETRIES if retries is None else retries
+        self.backoff = ESPNET_BACKOFF if backoff is None else backoff
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.client = None
+        self.lock = threading.Lock()
+    
+    def _get_client(self):
+        with self.lock:
+            if self.client is None:
+                from gradio_client import Client
+                self.client = Client(
+                    self.src,
+                    max_workers=self.max_concurrency,
+                    verbose=False,
+                    analytics_enabled=False
+                )
+            return self.client
+    
+    def connect(self):
+        """Підключається до Space заздалегідь (рукостискання і конфігурація)"""
+        self._get_client()
+    
+    def _reset_client(self, client):
+        """Відкидає клієнт після збою, наступний запит створить новий"""
+        with self.lock:
+            if client is not None and self.client is client:
+                self.client = None
+                client.close()
+    
+    def _predict(self, text, speaker):
+        """Один запит до Space: повертає байти аудіо"""
+        client = self._get_client()
+        try:
+            with self.semaphore:
+                result = client.predict(text, speaker)
+        except Exception as e:
+            if self._is_connection_error(e):
+                self._reset_client(client)
+            raise
+        
+        # result може бути кортежем (аудіо, текст з наголосами), беремо перший елемент
+        audio_path = result[0] if isinstance(result, tuple) else result
+        if not audio_path or not os.path.exists(audio_path):
+            raise Exception("API не повернув файл")
+        try:
+            with open(audio_path, 'rb') as f:
+                return f.read()
+        finally:
+            # Клієнт кладе кожен файл в окремий каталог - прибираємо обидва
+            os.remove(audio_path)
+            try:
+                os.rmdir(os.path.dirname(audio_path))
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _is_connection_error(error):
+        """Збій з'єднання, після якого клієнт варто створити заново"""
+        import httpx
+        return isinstance(error, (httpx.NetworkError, httpx.ConnectTimeout, httpx.RemoteProtocolError, ConnectionError))
+    
+    @staticmethod
+    def _is_transient(error):
+        """Збій, який може зникнути при повторі: з'єднання, тайм-аут, HTTP 5xx/429, черга переповнена"""
+        import httpx
+        from gradio_client.utils import QueueError, TooManyRequestsError
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status >= 500 or status == 429
+        return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError, QueueError, TooManyRequestsError))
+    
+    def synthesize(self, text, speaker):
+        """Озвучує текст і повертає аудіо (зазвичай WAV) байтами"""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                return self._predict(text, speaker)
+            except Exception as e:
+                if not self._is_transient(e):
+                    # Повтор тут не допоможе
+                    raise Exception(f"UA-ESPNET помилка: {e}")
+                last_error = e
+        raise Exception(f"UA-ESPNET помилка (спроб: {self.retries + 1}): {last_error}")
+
+def get_espnet_engine():
+    """Повертає спільний клієнт UA-ESPNET, створюючи його при першому виклику"""
+    global ESPNET_ENGINE
+    with ESPNET_ENGINE_LOCK:
+        if ESPNET_ENGINE is None:
+            ESPNET_ENGINE = EspnetEngine(base_url=os.environ.get("ESPNET_URL"))
+        return ESPNET_ENGINE
+
+def espnet_audio_format(data):
+    """Формат відповіді ESPNET: Space віддає WAV, інше декодується через FFmpeg"""
+    return 'wav' if data[:4] == b'RIFF' else 'mp3'
+
+def time_stretch(pcm, target_samples, sample_rate, frame_ms=None, tolerance_ms=None):
+    """Змінює тривалість PCM без зміни висоти тону (WSOLA), рівно до target_samples семплів.
+    
+    Вихід збирається з вікон Ганна з кроком у пів вікна. Кожне наступне вікно
+    береться з околу номінальної позиції там, де воно найкраще продовжує
+    попереднє (максимум кореляції): спочатку грубо на проріджених у 4 рази
+    даних, потім точно. Для стерео позиції шукаються за сумою каналів.
+    """
+    if frame_ms is None:
+        frame_ms = WSOLA_FRAME_MS
+    if tolerance_ms is None:
+        tolerance_ms = WSOLA_TOLERANCE_MS
+    
+    pcm = np.asarray(pcm, dtype=np.float32)
+    if pcm.ndim == 1:
+        pcm = pcm[:, np.newaxis]
+    num_samples, channels = pcm.shape
+    if target_samples <= 0 or num_samples == 0:
+        return np.zeros((max(target_samples, 0), channels), dtype=np.float32)
+    
+    frame = max(64, int(sample_rate * frame_ms / 1000) // 2 * 2)
+    synthesis_hop = frame // 2
+    tolerance = max(1, int(sample_rate * tolerance_ms / 1000))
+    analysis_hop = synthesis_hop * num_samples / target_samples
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)).astype(np.float32)
+    
+    # Доповнюємо нулями, щоб перше і останнє вікна мали повний окіл для пошуку
+    source = np.concatenate([
+        np.zeros((synthesis_hop + tolerance, channels), dtype=np.float32),
+        pcm,
+        np.zeros((frame + 2 * tolerance + int(analysis_hop) + 1, channels), dtype=np.float32)
+    ])
+    mono = source.mean(axis=1)
+    decimation = 4
+    coarse = mono[:len(mono) // decimation * decimation].reshape(-1, decimation).mean(axis=1)
+    coarse_frame = frame // decimation
+    coarse_tolerance = tolerance // decimation + 1
+    
+    num_frames = target_samples // synthesis_hop + 3
+    output = np.zeros(((num_frames - 1) * synthesis_hop + frame, channels), dtype=np.float32)
+    window_sum = np.zeros(len(output), dtype=np.float32)
+    
+    previous = None
+    for k in range(num_frames):
+        nominal = int(round(tolerance + synthesis_hop + (k - 1) * analysis_hop))
+        nominal = min(max(nominal, tolerance), len(source) - frame - tolerance)
+        if previous is None:
+            position = nominal
+        else:
+            natural = min(previous + synthesis_hop, len(source) - frame)
+            # Грубий пошук на проріджених даних
+            coarse_nominal = nominal // decimation
+            low = max(coarse_nominal - coarse_tolerance, 0)
+            region = coarse[low:coarse_nominal + coarse_tolerance + coarse_frame]
+            template = coarse[natural // decimation:natural // decimation + coarse_frame]
+            guess = (low + int(np.argmax(sliding_window_view(region, coarse_frame) @ template))) * decimation
+            # Уточнення на повній частоті
+            low = min(max(guess - decimation, 0), len(source) - frame - 2 * decimation)
+            region = mono[low:low + frame + 2 * decimation]
+            position = low + int(np.argmax(sliding_window_view(region, frame) @ mono[natural:natural + frame]))
+        
+        start = k * synthesis_hop
+        output[start:start + frame] += source[position:position + frame] * window[:, np.newaxis]
+        window_sum[start:start + frame] += window
+        previous = position
+    
+    output = output[synthesis_hop:synthesis_hop + target_samples]
+    return output / np.maximum(window_sum[synthesis_hop:synthesis_hop + target_samples], 1e-3)[:, np.newaxis]
+
+def ms_to_samples(duration_ms, sample_rate=None):
+    """Переводить мілісекунди в кількість семплів"""
+    if sample_rate is None:
+        sample_rate = TIMELINE_SAMPLE_RATE
+    return int(round(duration_ms * sample_rate / 1000.0))
+
+def decode_audio_bytes(data):
+    """Декодує стиснене аудіо (MP3 тощо) з пам'яті через stdin FFmpeg.
+    
+    FFmpeg лише декодує, не змінюючи частоту і канали: WAV з float32 на виході
+    несе їх у заголовку, а до формату таймлайну PCM приводить convert_pcm.
+    Повертає (PCM float32 (n, канали), частота).
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-i', '-', '-f', 'wav', '-acodec', 'pcm_f32le', '-']
+    result = subprocess.run(cmd, input=data, capture_output=True, check=True)
+    return wav_bytes_to_pcm(result.stdout)
+
+class StreamingEncoder:
+    """Один довгоживучий процес FFmpeg, якому PCM подається через stdin по частинах.
+    
+    Вихідний файл росте в міру надходження даних, тому його початок можна
+    слухати ще до кінця рендеру. output_format - ключ OUTPUT_FORMATS; з
+    video_path озвучка одразу вбудовується у копію відео (відеопотік не
+    перекодовується), і окремий аудіофайл не потрібен. spliceable=True додає
+    SPLICE_CODEC_ARGS, щоб файл потім можна було латати по частинах.
+    """
+    
+    def __init__(self, output_file, sample_rate=None, channels=None, output_format=None, video_path=None, spliceable=False):
+        self.output_file = output_file
+        self.sample_rate = sample_rate or TIMELINE_SAMPLE_RATE
+        self.channels = channels or TIMELINE_CHANNELS
+        self.samples_written = 0
+        # stderr у тимчасовий файл, щоб переповнений pipe не заблокував FFmpeg
+        self.stderr_file = tempfile.TemporaryFile()
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'f32le', '-ar', str(self.sample_rate), '-ac', str(self.channels), '-i', '-'
+        ]
+        if video_path:
+            cmd += ['-i', video_path, '-map', '1:v', '-map', '0:a', '-c:v', 'copy']
+        output_format = output_format or OUTPUT_FORMAT
+        cmd += OUTPUT_FORMATS[output_format]["codec"]
+        if spliceable:
+            cmd += SPLICE_CODEC_ARGS.get(output_format, [])
+        cmd += ['-y', output_file]
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self.stderr_file
+        )
+    
+    def write(self, pcm):
+        """Дописує PCM (семпли, канали) у кінець файлу"""
+        # Шматками по ~10 секунд, щоб не копіювати великий буфер цілком
+        chunk = self.sample_rate * 10
+        for start in range(0, len(pcm), chunk):
+            block = np.clip(pcm[start:start + chunk], -1.0, 1.0)
+            self.process.stdin.write(block.astype(np.float32).tobytes())
+        self.samples_written += len(pcm)
+    
+    def write_silence(self, num_samples):
+        """Дописує тишу заданої довжини"""
+        chunk = self.sample_rate * 10
+        while num_samples > 0:
+            size = min(chunk, num_samples)
+            self.write(np.zeros((size, self.channels), dtype=np.float32))
+            num_samples -= size
+    
+    def close(self):
+        """Завершує кодування і чекає на FFmpeg"""
+        try:
+            self.process.stdin.close()
+        finally:
+            self.process.wait()
+        self.stderr_file.seek(0)
+        stderr = self.stderr_file.read()
+        self.stderr_file.close()
+        if self.process.returncode != 0:
+            raise Exception(f"FFmpeg помилка кодування: {stderr.decode(errors='ignore')}")
+        return True
+    
+    def abort(self):
+        """Зупиняє FFmpeg без завершення файлу"""
+        self.process.kill()
+        self.process.wait()
+        self.stderr_file.close()
+
+def encode_pcm_to_file(pcm, output_file, sample_rate=None, channels=None, output_format=None, video_path=None, spliceable=False):
+    """Кодує PCM одним проходом FFmpeg (дані подаються через stdin), див. StreamingEncoder"""
+    if channels is None:
+        channels = 1 if np.ndim(pcm) == 1 else np.shape(pcm)[1]
+    encoder = StreamingEncoder(output_file, sample_rate, channels, output_format, video_path, spliceable)
+    try:
+        encoder.write(np.asarray(pcm, dtype=np.float32).reshape(-1, channels))
+    except Exception:
+        encoder.abort()
+        raise
+    return encoder.close()
+
+class AudioClip:
+    """Фрагмент аудіо в пам'яті: PCM float32 (семпли, канали) та його частота.
+    
+    Тривалість завжди рахується з кількості семплів, тому її не треба
+    визначати зовнішніми програмами.
+    """
+    
+    def __init__(self, pcm, sample_rate, channels=None):
+        pcm = np.asarray(pcm, dtype=np.float32)
+        if pcm.ndim == 1:
+            pcm = pcm.reshape(-1, channels or 1)
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+    
+    @property
+    def channels(self):
+        return self.pcm.shape[1]
+    
+    @property
+    def num_samples(self):
+        return len(self.pcm)
+    
+    @property
+    def duration_ms(self):
+        return self.num_samples * 1000.0 / self.sample_rate
+
+class AudioTimeline:
+    """Аудіодоріжка в пам'яті: кожен субтитр пишеться за своїм точним зсувом"""
+    
+    def __init__(self, duration_ms=0, sample_rate=None, channels=None):
+        self.sample_rate = sample_rate or TIMELINE_SAMPLE_RATE
+        self.channels = channels or TIMELINE_CHANNELS
+        # Паузи між субтитрами - це просто нулі в буфері
+        self.buffer = np.zeros((ms_to_samples(duration_ms, self.sample_rate), self.channels), dtype=np.float32)
+    
+    @property
+    def duration_ms(self):
+        return len(self.buffer) * 1000.0 / self.sample_rate
+    
+    def ensure_length(self, num_samples):
+        """Подовжує буфер тишею, якщо озвучка виходить за його межі"""
+        if num_samples > len(self.buffer):
+            extra = np.zeros((num_samples - len(self.buffer), self.channels), dtype=np.float32)
+            self.buffer = np.concatenate([self.buffer, extra])
+    
+    def set_length(self, num_samples):
+        """Задає точну довжину доріжки: доповнює тишею або обрізає"""
+        self.ensure_length(num_samples)
+        self.buffer = self.buffer[:num_samples]
+    
+    def place_at(self, offset, clip):
+        """Змішує фрагмент у буфер, починаючи з семплу offset"""
+        end = offset + clip.num_samples
+        self.ensure_length(end)
+        self.buffer[offset:end] += clip.pcm
+        return end
+    
+    def encode(self, output_file, output_format=None, video_path=None, spliceable=False):
+        """Кодує всю доріжку у вихідний файл (див. StreamingEncoder)"""
+        return encode_pcm_to_file(self.buffer, output_file, self.sample_rate, self.channels, output_format, video_path, spliceable)
+    
+    def close(self):
+        """Звільняє буфер"""
+        self.buffer = np.zeros((0, self.channels), dtype=np.float32)
+
+class MappedAudioTimeline(AudioTimeline):
+    """Аудіодоріжка у тимчасовому файлі raw PCM (float32) на диску.
+    
+    Субтитри пишуться у свої вікна семплів через memory map, а кодер читає
+    файл шматками, тому пам'ять не залежить від тривалості фільму.
+    """
+    
+    def __init__(self, duration_ms=0, sample_rate=None, channels=None, scratch_dir=None, path=None):
+        self.sample_rate = sample_rate or TIMELINE_SAMPLE_RATE
+        self.channels = channels or TIMELINE_CHANNELS
+        self.frame_bytes = 4 * self.channels
+        # path - доріжка, яка лишається після close (інкрементальна переозвучка);
+        # якщо файл уже є, його вміст використовується
+        self.keep = path is not None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="timeline_", suffix=".f32", dir=scratch_dir)
+            os.close(fd)
+        else:
+            open(path, 'ab').close()
+        self.path = path
+        self.num_samples = os.path.getsize(path) // self.frame_bytes
+        self.ensure_length(ms_to_samples(duration_ms, self.sample_rate))
+    
+    @property
+    def duration_ms(self):
+        return self.num_samples * 1000.0 / self.sample_rate
+    
+    def ensure_length(self, num_samples):
+        """Подовжує файл тишею, якщо озвучка виходить за його межі"""
+        if num_samples > self.num_samples:
+            self.set_length(num_samples)
+    
+    def set_length(self, num_samples):
+        """Задає точну довжину доріжки: нові байти файлу - нулі, тобто тиша"""
+        with open(self.path, 'r+b') as f:
+            f.truncate(num_samples * self.frame_bytes)
+        self.num_samples = num_samples
+    
+    def window(self, offset, num_samples):
+        """Memory map вікна доріжки [offset, offset + num_samples)"""
+        return np.memmap(
+            self.path, dtype=np.float32, mode='r+',
+            offset=offset * self.frame_bytes, shape=(num_samples, self.channels)
+        )
+    
+    def place_at(self, offset, clip):
+        """Змішує фрагмент у файл, відображаючи в пам'ять лише його вікно"""
+        end = offset + clip.num_samples
+        self.ensure_length(end)
+        if clip.num_samples:
+            view = self.window(offset, clip.num_samples)
+            view += clip.pcm
+            view.flush()
+            del view
+        return end
+    
+    def encode(self, output_file, output_format=None, video_path=None, spliceable=False):
+        """Кодує доріжку, подаючи її кодеру шматками по ~10 секунд"""
+        encoder = StreamingEncoder(output_file, self.sample_rate, self.channels, output_format, video_path, spliceable)
+        chunk = self.sample_rate * 10
+        try:
+            for start in range(0, self.num_samples, chunk):
+                view = self.window(start, min(chunk, self.num_samples - start))
+                encoder.write(np.array(view))
+                del view
+        except Exception:
+            encoder.abort()
+            raise
+        return encoder.close()
+    
+    def close(self):
+        """Видаляє тимчасовий файл (збережену доріжку лишає)"""
+        if not self.keep and os.path.exists(self.path):
+            os.remove(self.path)
+
+class ClipSpool:
+    """Озвучені субтитри в тимчасовому файлі, доки не готовий план таймінгу.
+    
+    Поводиться як список кліпів: append, clips[i] та clips[i] = None.
+    """
+    
+    def __init__(self, sample_rate=None, channels=None, scratch_dir=None):
+        self.sample_rate = sample_rate or TIMELINE_SAMPLE_RATE
+        self.channels = channels or TIMELINE_CHANNELS
+        self.frame_bytes = 4 * self.channels
+        self.slots = []
+        self.file = tempfile.TemporaryFile(prefix="clips_", suffix=".f32", dir=scratch_dir)
+    
+    def __len__(self):
+        return len(self.slots)
+    
+    def append(self, clip):
+        """Дописує PCM кліпу в кінець файлу"""
+        self.file.seek(0, os.SEEK_END)
+        self.slots.append((self.file.tell(), clip.num_samples))
+        self.file.write(np.ascontiguousarray(clip.pcm, dtype=np.float32).tobytes())
+    
+    def __getitem__(self, index):
+        offset, num_samples = self.slots[index]
+        self.file.seek(offset)
+        data = self.file.read(num_samples * self.frame_bytes)
+        return AudioClip(np.frombuffer(data, dtype=np.float32).reshape(-1, self.channels), self.sample_rate)
+    
+    def __setitem__(self, index, clip):
+        # Кліп уже на диску, тому звільняти в пам'яті нічого
+        if clip is not None:
+            raise TypeError("ClipSpool підтримує лише clips[i] = None")
+    
+    def close(self):
+        self.file.close()
+
+# Таблиці заголовків MPEG Audio Layer III
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000]
+}
+
+def parse_mp3_frame_header(header):
+    """Розбирає 4 байти заголовка MP3 кадру: (версія, частота, к-сть каналів, семплів у кадрі, довжина кадру)"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}.get((header[1] >> 3) & 0x03)
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    rate_index = (header[2] >> 2) & 0x03
+    # Підтримуємо лише Layer III - саме його пишуть FFmpeg і Edge TTS
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    
+    bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if (header[3] >> 6) == 3 else 2
+    samples_per_frame = 1152 if version == 1 else 576
+    frame_length = (samples_per_frame // 8) * bitrate // sample_rate + padding
+    return version, sample_rate, channels, samples_per_frame, frame_length
+
+def probe_mp3_duration(data):
+    """Тривалість MP3 у мс з Xing/Info (+ LAME затримки), VBRI або підрахунку кадрів"""
+    offset = 0
+    # Пропускаємо ID3v2 тег
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size
+    
+    # Шукаємо перший кадр
+    while offset + 4 <= len(data) and parse_mp3_frame_header(data[offset:offset + 4]) is None:
+        offset += 1
+    first = parse_mp3_frame_header(data[offset:offset + 4])
+    if first is None:
+        raise Exception("MP3 кадри не знайдено")
+    version, sample_rate, channels, samples_per_frame, _ = first
+    
+    # Xing/Info заголовок стоїть одразу після side info першого кадру
+    if version == 1:
+        side_info = 32 if channels == 2 else 17
+    else:
+        side_info = 17 if channels == 2 else 9
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 0x01:
+            frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+            # LAME тег після полів Xing містить затримку та доповнення енкодера
+            lame = xing + 8 + 4 + (4 if flags & 0x02 else 0) + (100 if flags & 0x04 else 0) + (4 if flags & 0x08 else 0)
+            delay = padding = 0
+            if data[lame:lame + 4] in (b'LAME', b'Lavc', b'Lavf'):
+                delay = (data[lame + 21] << 4) | (data[lame + 22] >> 4)
+                padding = ((data[lame + 22] & 0x0F) << 8) | data[lame + 23]
+            samples = frames * samples_per_frame - delay - padding
+            return max(samples, 0) * 1000.0 / sample_rate
+    
+    vbri = offset + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI':
+        frames = int.from_bytes(data[vbri + 14:vbri + 18], 'big')
+        return frames * samples_per_frame * 1000.0 / sample_rate
+    
+    # Без інформаційного заголовка просто рахуємо кадри
+    frames = 0
+    while offset + 4 <= len(data):
+        header = parse_mp3_frame_header(data[offset:offset + 4])
+        if header is None:
+            break
+        frames += 1
+        offset += header[4]
+    return frames * samples_per_frame * 1000.0 / sample_rate
+
+def make_crc16_table():
+    """Таблиця CRC-16/ARC (поліном 0x8005, віддзеркалений), яким LAME захищає свій тег"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return np.array(table, dtype=np.uint16)
+
+CRC16_TABLE = make_crc16_table()
+# Скільки байтів в одному блоці паралельного підрахунку CRC
+CRC16_BLOCK = 4096
+
+def crc16(data):
+    """CRC-16/ARC байтів data.
+    
+    Дані ріжуться на блоки, CRC усіх блоків рахуються паралельно (numpy), а
+    потім зшиваються: CRC з нульовим початком лінійний, тож зсув уже
+    порахованого значення на блок нульових байтів - це дві таблиці по 256.
+    """
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    # Нулі на початку не змінюють CRC з нульовим початковим значенням
+    padding = -len(data) % CRC16_BLOCK
+    blocks = np.concatenate([np.zeros(padding, dtype=np.uint8), data]).reshape(-1, CRC16_BLOCK)
+    
+    crcs = np.zeros(len(blocks), dtype=np.uint16)
+    low = np.arange(256, dtype=np.uint16)
+    high = low << 8
+    for column in range(CRC16_BLOCK):
+        crcs = CRC16_TABLE[(crcs ^ blocks[:, column]) & 0xFF] ^ (crcs >> 8)
+        low = CRC16_TABLE[low & 0xFF] ^ (low >> 8)
+        high = CRC16_TABLE[high & 0xFF] ^ (high >> 8)
+    
+    low, high = low.tolist(), high.tolist()
+    crc = 0
+    for block_crc in crcs.tolist():
+        crc = low[crc & 0xFF] ^ high[crc >> 8] ^ block_crc
+    return crc
+
+# Кадри з кожного боку зміни, які перекодовуються як розгін кодера і не потрапляють у файл
+MP3_SPLICE_PREROLL = 4
+# Наскільки далеко (у кадрах) шукати тишу для місця склейки
+MP3_SPLICE_SEARCH = 200
+
+def parse_mp3(data):
+    """Розбирає MP3, записаний FFmpeg: ID3, кадр Xing з тегом LAME і аудіокадри.
+    
+    Повертає словник: "start" - зсув кадру Xing, "frames" - [(зсув, довжина)]
+    аудіокадрів, "samples" - семплів у кадрі, "xing" - зсув тегу Xing,
+    "lame" - зсув тегу LAME, "delay" і "padding" - затримка кодера і
+    доповнення в кінці (семпли). ValueError - файл іншої будови.
+    """
+    start = 0
+    if data[:3] == b'ID3':
+        start = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | data[9] & 0x7F)
+        if data[5] & 0x10:
+            start += 10
+    
+    frames = []
+    offset = start
+    while True:
+        header = parse_mp3_frame_header(data[offset:offset + 4])
+        if header is None:
+            break
+        frames.append((offset, header[4]))
+        offset += header[4]
+    if not frames:
+        raise ValueError("MP3 без кадрів")
+    version, _, channels, samples_per_frame, _ = parse_mp3_frame_header(data[start:start + 4])
+    
+    # Xing/Info заголовок стоїть одразу після side info першого кадру
+    if version == 1:
+        side_info = 32 if channels == 2 else 17
+    else:
+        side_info = 17 if channels == 2 else 9
+    xing = start + 4 + side_info
+    if data[xing:xing + 4] not in (b'Xing', b'Info'):
+        raise ValueError("MP3 без заголовка Xing")
+    # Усі поля Xing (кадри, байти, таблиця, якість), як пише FFmpeg
+    if int.from_bytes(data[xing + 4:xing + 8], 'big') & 0x0F != 0x0F:
+        raise ValueError("Неповний заголовок Xing")
+    lame = xing + 8 + 4 + 4 + 100 + 4
+    if data[lame:lame + 4] not in (b'LAME', b'Lavc', b'Lavf'):
+        raise ValueError("MP3 без тегу LAME")
+    return {
+        "start": start,
+        "frames": frames[1:],
+        "samples": samples_per_frame,
+        "xing": xing,
+        "lame": lame,
+        "delay": (data[lame + 21] << 4) | (data[lame + 22] >> 4),
+        "padding": ((data[lame + 22] & 0x0F) << 8) | data[lame + 23]
+    }
+
+def splice_mp3(data, region_data, first, last, region_offset):
+    """Замінює аудіокадри [first, last) у data кадрами з region_data.
+    
+    region_data - MP3, закодований з того ж місця сітки кадрів: його кадр i
+    відповідає кадру region_offset + i у data. last=None - до кінця файлу
+    (тоді кінцеве доповнення береться з region_data). Заголовок Xing і тег LAME
+    (кількість кадрів, байти, таблиця перемотування, CRC) оновлюються.
+    """
+    old = parse_mp3(data)
+    region = parse_mp3(region_data)
+    if (region["samples"], region["delay"]) != (old["samples"], old["delay"]):
+        raise ValueError("Фрагмент закодовано з іншою затримкою або розміром кадру")
+    
+    kept = region["frames"][first - region_offset:None if last is None else last - region_offset]
+    if last is not None and len(kept) != last - first:
+        raise ValueError("Фрагмент коротший за ділянку, яку треба замінити")
+    frames = (
+        [data[offset:offset + size] for offset, size in old["frames"][:first]]
+        + [region_data[offset:offset + size] for offset, size in kept]
+        + ([] if last is None else [data[offset:offset + size] for offset, size in old["frames"][last:]])
+    )
+    
+    xing_offset, xing_size = old["start"], old["frames"][0][0] - old["start"]
+    header = bytearray(data[xing_offset:xing_offset + xing_size])
+    xing, lame = old["xing"] - xing_offset, old["lame"] - xing_offset
+    audio = b"".join(frames)
+    total_bytes = xing_size + len(audio)
+    
+    header[xing + 8:xing + 12] = len(frames).to_bytes(4, 'big')
+    header[xing + 12:xing + 16] = total_bytes.to_bytes(4, 'big')
+    # Таблиця перемотування: позиція кожного відсотка тривалості в 1/256 файлу
+    positions = np.cumsum([xing_size] + [len(frame) for frame in frames])
+    for i in range(100):
+        header[xing + 16 + i] = min(255, int(positions[i * len(frames) // 100] * 256 // total_bytes))
+    padding = region["padding"] if last is None else old["padding"]
+    header[lame + 21:lame + 24] = (old["delay"] << 12 | padding).to_bytes(3, 'big')
+    header[lame + 28:lame + 32] = total_bytes.to_bytes(4, 'big')
+    header[lame + 32:lame + 34] = crc16(audio).to_bytes(2, 'big')
+    header[lame + 34:lame + 36] = crc16(header[:lame + 34]).to_bytes(2, 'big')
+    return data[:xing_offset] + bytes(header) + audio
+
+def reencode_mp3_region(output_path, timeline, start, end):
+    """Перекодовує в готовому MP3 лише кадри, що покривають семпли доріжки [start, end).
+    
+    Усі кодування мають ту саму сітку кадрів і затримку кодера, тому фрагмент,
+    закодований з межі кадру, стає на місце старих кадрів без зсуву. Межі
+    склейки зсуваються в тишу, а кадри розгону кодера з обох боків
+    відкидаються. MP3 має бути закодований без бітового резервуару
+    (SPLICE_CODEC_ARGS), інакше кадри залежать від попередніх.
+    """
+    with open(output_path, 'rb') as f:
+        data = f.read()
+    mp3 = parse_mp3(data)
+    frame, delay = mp3["samples"], mp3["delay"]
+    margin = 2 * frame
+    total = timeline.num_samples
+    
+    def silent_boundary(index):
+        # Семпли доріжки навколо межі кадрів index
+        position = index * frame - delay
+        lo, hi = max(0, position - margin), min(total, position + margin)
+        return hi <= lo or not np.any(timeline.window(lo, hi - lo))
+    
+    first = max(0, (start + delay - margin) // frame)
+    for candidate in range(first, max(-1, first - MP3_SPLICE_SEARCH), -1):
+        if silent_boundary(candidate):
+            first = candidate
+            break
+    last = -(-(end + delay + margin) // frame)
+    for candidate in range(last, min(len(mp3["frames"]), last + MP3_SPLICE_SEARCH)):
+        if silent_boundary(candidate):
+            last = candidate
+            break
+    if last >= len(mp3["frames"]) - MP3_SPLICE_PREROLL:
+        last = None
+    
+    region_offset = max(0, first - MP3_SPLICE_PREROLL)
+    region_start = region_offset * frame
+    region_end = total if last is None else min(total, (last + MP3_SPLICE_PREROLL) * frame)
+    fd, region_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    try:
+        view = timeline.window(region_start, region_end - region_start)
+        encode_pcm_to_file(np.array(view), region_path, timeline.sample_rate, timeline.channels, "mp3", spliceable=True)
+        del view
+        with open(region_path, 'rb') as f:
+            region_data = f.read()
+    finally:
+        os.remove(region_path)
+    
+    spliced = splice_mp3(data, region_data, first, last, region_offset)
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(spliced)
+    os.replace(temp_path, output_path)
+    return (region_end - region_start) * 1000.0 / timeline.sample_rate
+
+def probe_wav_duration(data):
+    """Тривалість WAV у мс за RIFF заголовком (fmt та data чанки)"""
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise Exception("Це не WAV файл")
+    
+    offset = 12
+    block_align = sample_rate = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = int.from_bytes(data[offset + 4:offset + 8], 'little')
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            sample_rate = int.from_bytes(data[body + 4:body + 8], 'little')
+            block_align = int.from_bytes(data[body + 12:body + 14], 'little')
+        elif chunk_id == b'data':
+            if not block_align or not sample_rate:
+                raise Exception("WAV без fmt чанку")
+            # У WAV з pipe розмір може бути не заповнений - беремо фактичний
+            data_size = min(chunk_size, len(data) - body)
+            return data_size // block_align * 1000.0 / sample_rate
+        offset = body + chunk_size + (chunk_size & 1)
+    raise Exception("WAV без data чанку")
+
+def patch_wav_region(output_path, timeline, start, end):
+    """Переписує в готовому 16-бітному WAV лише семпли [start, end).
+    
+    Якщо змінилася довжина доріжки, файл обрізається або дописується від start
+    до кінця, а розміри в заголовку оновлюються.
+    """
+    with open(output_path, 'r+b') as f:
+        header = f.read(4096)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError("Це не WAV файл")
+        offset = 12
+        data_offset = None
+        while offset + 8 <= len(header):
+            chunk_id = header[offset:offset + 4]
+            chunk_size = int.from_bytes(header[offset + 4:offset + 8], 'little')
+            if chunk_id == b'fmt ':
+                format_tag = int.from_bytes(header[offset + 8:offset + 10], 'little')
+                channels = int.from_bytes(header[offset + 10:offset + 12], 'little')
+                sample_rate = int.from_bytes(header[offset + 12:offset + 16], 'little')
+                bits = int.from_bytes(header[offset + 22:offset + 24], 'little')
+                if (format_tag, bits, channels, sample_rate) != (1, 16, timeline.channels, timeline.sample_rate):
+                    raise ValueError("WAV в іншому форматі, ніж доріжка")
+            elif chunk_id == b'data':
+                data_offset = offset + 8
+                break
+            offset += 8 + chunk_size + (chunk_size & 1)
+        if data_offset is None:
+            raise ValueError("WAV без data чанку")
+        
+        frame_bytes = 2 * timeline.channels
+        old_samples = (os.fstat(f.fileno()).st_size - data_offset) // frame_bytes
+        if old_samples != timeline.num_samples:
+            # Довжина змінилася: переписуємо все від start до нового кінця
+            end = timeline.num_samples
+            f.truncate(data_offset + start * frame_bytes)
+        chunk = timeline.sample_rate * 10
+        for position in range(start, end, chunk):
+            view = timeline.window(position, min(chunk, end - position))
+            samples = np.clip(np.rint(np.asarray(view) * 32768.0), -32768, 32767).astype('<i2')
+            del view
+            f.seek(data_offset + position * frame_bytes)
+            f.write(samples.tobytes())
+        data_size = timeline.num_samples * frame_bytes
+        f.seek(4)
+        f.write((data_offset - 8 + data_size).to_bytes(4, 'little'))
+        f.seek(data_offset - 4)
+        f.write(data_size.to_bytes(4, 'little'))
+    return (end - start) * 1000.0 / timeline.sample_rate
+
+def probe_audio_duration(path):
+    """Визначає тривалість файлу в мс: MP3/WAV - із заголовків, інші формати і відео - через ffprobe"""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".mp3", ".wav"):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == b'RIFF':
+            return probe_wav_duration(data)
+        return probe_mp3_duration(data)
+    
+    cmd = [
+        'ffprobe', '-v', 'error', '-show_entries',
+        'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
+        str(path)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip()) * 1000.0
+
+def resample_pcm(pcm, source_rate, sample_rate):
+    """Поліфазний ресемплінг PCM (семпли, канали) з FIR фільтром проти аліасингу.
+    
+    Частоти зводяться до цілого відношення up/down (24000 -> 44100 = 147/80),
+    і всі канали обробляються одним векторним викликом.
+    """
+    from scipy.signal import resample_poly
+    
+    divisor = np.gcd(int(source_rate), int(sample_rate))
+    up, down = int(sample_rate) // divisor, int(source_rate) // divisor
+    resampled = resample_poly(pcm, up, down, axis=0)
+    # Рівно стільки семплів, скільки дає тривалість, щоб таймінг не плив
+    return resampled[:int(round(len(pcm) * up / down))].astype(np.float32)
+
+def convert_pcm(pcm, source_rate, sample_rate=None, channels=None):
+    """Приводить PCM до частоти та кількості каналів таймлайну, повертає AudioClip"""
+    if sample_rate is None:
+        sample_rate = TIMELINE_SAMPLE_RATE
+    if channels is None:
+        channels = TIMELINE_CHANNELS
+    
+    pcm = np.asarray(pcm, dtype=np.float32)
+    if pcm.ndim == 1:
+        pcm = pcm[:, np.newaxis]
+    
+    # Зведення до моно робимо до ресемплінгу, а розмноження каналів - після,
+    # щоб фільтрувати якомога менше каналів
+    if pcm.shape[1] != channels and (channels == 1 or pcm.shape[1] > 1):
+        pcm = pcm.mean(axis=1, keepdims=True)
+    if source_rate != sample_rate and len(pcm) > 0:
+        pcm = resample_pcm(pcm, source_rate, sample_rate)
+    if pcm.shape[1] != channels:
+        pcm = np.repeat(pcm, channels, axis=1)
+    return AudioClip(pcm, sample_rate)
+
+def pcm_to_wav_bytes(pcm, sample_rate, channels=1):
+    """Пакує PCM float32 (моно або (семпли, канали)) у 16-бітний WAV в пам'яті"""
+    samples = (np.clip(np.asarray(pcm, dtype=np.float32).reshape(-1), -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+# Типи семплів WAV: (код формату, біт на семпл) -> (dtype, масштаб)
+WAV_SAMPLE_TYPES = {
+    (1, 16): ('<i2', 32768.0),
+    (1, 32): ('<i4', 2147483648.0),
+    (3, 32): ('<f4', 1.0)
+}
+
+def wav_bytes_to_pcm(data):
+    """Читає WAV з пам'яті (16/32-бітний PCM або float32): повертає (PCM float32 (n, канали), частота)"""
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("Це не WAV файл")
+    
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = int.from_bytes(data[offset + 4:offset + 8], 'little')
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            format_tag = int.from_bytes(data[body:body + 2], 'little')
+            if format_tag == 0xFFFE:
+                # WAVE_FORMAT_EXTENSIBLE: справжній код формату на початку SubFormat
+                format_tag = int.from_bytes(data[body + 24:body + 26], 'little')
+            channels = int.from_bytes(data[body + 2:body + 4], 'little')
+            sample_rate = int.from_bytes(data[body + 4:body + 8], 'little')
+            bits = int.from_bytes(data[body + 14:body + 16], 'little')
+            fmt = WAV_SAMPLE_TYPES.get((format_tag, bits))
+            if fmt is None:
+                raise ValueError(f"Непідтримуваний формат WAV: код {format_tag}, {bits} біт")
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV без fmt чанку")
+            # У WAV з pipe розмір може бути не заповнений - беремо фактичний
+            if chunk_size in (0, 0xFFFFFFFF) or chunk_size > len(data) - body:
+                chunk_size = len(data) - body
+            dtype, scale = fmt
+            frame_bytes = np.dtype(dtype).itemsize * channels
+            frames = data[body:body + chunk_size - chunk_size % frame_bytes]
+            pcm = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+            if scale != 1.0:
+                pcm /= scale
+            return pcm.reshape(-1, channels), sample_rate
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV без data чанку")
+
+def normalize_text(text):
+    """Нормалізує текст для ключа кешу: Unicode NFC і схлопнуті пробіли"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def file_hash(path):
+    """SHA-256 файлу моделі (запам'ятовується, поки файл не змінився)"""
+    stat = os.stat(path)
+    marker = (path, stat.st_size, stat.st_mtime)
+    with MODEL_HASHES_LOCK:
+        if marker in MODEL_HASHES:
+            return MODEL_HASHES[marker]
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    
+    with MODEL_HASHES_LOCK:
+        MODEL_HASHES[marker] = digest.hexdigest()
+    return MODEL_HASHES[marker]
+
+class SynthesisCache:
+    """Кеш озвученого аудіо на диску з адресацією за вмістом.
+    
+    Ключ - движок, голос, номер спікера Piper, хеш файлу моделі та нормалізований
+    текст. Значення - сирий результат движка (MP3 або WAV). Коли розмір кешу
+    перевищує max_bytes, видаляються записи, які найдовше не використовувались.
+    """
+    
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or SYNTHESIS_CACHE_DIR
+        self.max_bytes = SYNTHESIS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # ключ -> (формат, розмір); порядок - від найстарішого використання до найновішого
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._load_index()
+    
+    def _load_index(self):
+        """Відновлює LRU порядок з часу модифікації файлів (він оновлюється при влучанні)"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        files = []
+        for name in os.listdir(self.cache_dir):
+            key, _, fmt = name.partition('.')
+            if fmt not in ('mp3', 'wav'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, key, fmt, stat.st_size))
+        for _, key, fmt, size in sorted(files):
+            self.entries[key] = (fmt, size)
+            self.total_bytes += size
+    
+    def _path(self, key, fmt):
+        return os.path.join(self.cache_dir, f"{key}.{fmt}")
+    
+    def make_key(self, text, engine_type, voice_id):
+        """Будує ключ кешу для фрази"""
+        speaker = None
+        model_hash = ""
+        if engine_type == "piper":
+            model_info = get_piper_models()[voice_id]
+            speaker = model_info.get("speaker")
+            model_hash = file_hash(model_info["model"])
+        elif engine_type == "mms":
+            model_hash = mms_model_hash(voice_id)
+        
+        payload = json.dumps([engine_type, voice_id, speaker, model_hash, normalize_text(text)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Повертає (байти, формат) або None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        
+        fmt, _ = entry
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            # Файл видалили ззовні - вважаємо промахом
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.total_bytes -= entry[1]
+                self.misses += 1
+            return None
+        
+        with self.lock:
+            self.hits += 1
+        return data, fmt
+    
+    def put(self, key, data, fmt):
+        """Зберігає результат озвучки та витісняє старі записи понад ліміт"""
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key, fmt)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (fmt, len(data))
+            self.total_bytes += len(data)
+            
+            evicted = []
+            while self.total_bytes > self.max_bytes and self.entries:
+                old_key, (old_fmt, old_size) = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(self._path(old_key, old_fmt))
+        
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    
+    def stats(self):
+        """Повертає (влучання, промахи)"""
+        with self.lock:
+            return self.hits, self.misses
+
+def get_synthesis_cache():
+    """Повертає спільний кеш озвучки"""
+    global SYNTHESIS_CACHE
+    with SYNTHESIS_CACHE_LOCK:
+        if SYNTHESIS_CACHE is None:
+            SYNTHESIS_CACHE = SynthesisCache()
+        return SYNTHESIS_CACHE
+
+class JobManifest:
+    """Каталог завдання озвучки одного SRT одним голосом.
+    
+    manifest.jsonl - журнал: перший рядок описує завдання (SRT, движок, голос),
+    далі по рядку на кожен готовий субтитр (номер, хеш тексту, статус, сегмент).
+    Рядки лише дописуються, тому після збою втрачається щонайбільше останній.
+    Сегменти - 16-бітні WAV у форматі доріжки завдання (sample_rate, channels),
+    названі за хешем тексту, тож після вставки субтитру в SRT решта знаходиться.
+    Для інкрементальної переозвучки тут же лежать зібрана доріжка (timeline.f32)
+    і план попереднього рендеру (render.json).
+    """
+    
+    def __init__(self, srt_path, engine_type, voice_id, jobs_dir=None, sample_rate=None, channels=None):
+        self.srt_path = os.path.abspath(srt_path)
+        self.engine_type = engine_type
+        self.voice_id = voice_id
+        self.sample_rate = sample_rate or TIMELINE_SAMPLE_RATE
+        self.channels = channels or TIMELINE_CHANNELS
+        job_id = hashlib.sha256(
+            json.dumps([self.srt_path, engine_type, voice_id], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+        self.job_dir = os.path.join(jobs_dir or JOBS_DIR, job_id)
+        self.manifest_path = os.path.join(self.job_dir, "manifest.jsonl")
+        self.timeline_path = os.path.join(self.job_dir, "timeline.f32")
+        self.render_path = os.path.join(self.job_dir, "render.json")
+        self.lock = threading.Lock()
+        # номер субтитру -> запис журналу
+        self.entries = {}
+        # хеш тексту -> останній запис журналу з ним
+        self.by_hash = {}
+        self._load()
+    
+    def _load(self):
+        """Перечитує журнал попереднього запуску"""
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Обірваний рядок після аварійного завершення
+                    continue
+                if "index" in record:
+                    self.entries[record["index"]] = record
+                    self.by_hash[record["text_hash"]] = record
+    
+    def _append(self, record):
+        """Дописує рядок у журнал (викликається під self.lock)"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        is_new = not os.path.exists(self.manifest_path)
+        with open(self.manifest_path, 'a', encoding='utf-8') as f:
+            if is_new:
+                f.write(json.dumps({
+                    "srt": self.srt_path,
+                    "engine": self.engine_type,
+                    "voice": self.voice_id
+                }, ensure_ascii=False) + "\n")
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def text_hash(self, cue):
+        """Хеш тексту субтитру разом з движком, голосом і моделлю"""
+        return get_synthesis_cache().make_key(cue["text"], self.engine_type, self.voice_id)
+    
+    def entry(self, cue):
+        """Запис журналу з готовим сегментом саме для цього тексту (None, якщо немає).
+        
+        Шукається за номером субтитру, а якщо субтитри зсунулися - за хешем тексту.
+        """
+        text_hash = self.text_hash(cue)
+        with self.lock:
+            entry = self.entries.get(cue["index"])
+            if entry is None or entry["text_hash"] != text_hash:
+                entry = self.by_hash.get(text_hash)
+        if (
+            entry is None
+            or entry["status"] != "done"
+            or not os.path.exists(os.path.join(self.job_dir, entry["segment"]))
+        ):
+            return None
+        return entry
+    
+    def is_done(self, cue):
+        """Чи є готовий сегмент саме для цього тексту"""
+        return self.entry(cue) is not None
+    
+    def load(self, cue):
+        """Читає готовий сегмент субтитру як AudioClip"""
+        entry = self.entry(cue)
+        if entry is None:
+            raise KeyError(f"Субтитр {cue['index']} ще не озвучено")
+        with open(os.path.join(self.job_dir, entry["segment"]), 'rb') as f:
+            pcm, sample_rate = wav_bytes_to_pcm(f.read())
+        # Сегменти попереднього запуску могли бути в іншому форматі
+        return convert_pcm(pcm, sample_rate, self.sample_rate, self.channels)
+    
+    def store(self, cue, clip):
+        """Зберігає озвучений субтитр і позначає його готовим"""
+        text_hash = self.text_hash(cue)
+        segment = f"{text_hash[:20]}.wav"
+        os.makedirs(self.job_dir, exist_ok=True)
+        path = os.path.join(self.job_dir, segment)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(pcm_to_wav_bytes(clip.pcm, clip.sample_rate, clip.channels))
+        os.replace(temp_path, path)
+        
+        record = {
+            "index": cue["index"],
+            "text_hash": text_hash,
+            "status": "done",
+            "segment": segment,
+            "samples": clip.num_samples
+        }
+        with self.lock:
+            self._append(record)
+            self.entries[cue["index"]] = record
+            self.by_hash[text_hash] = record
+    
+    def mark_complete(self, output_path):
+        """Записує в журнал, що файл повністю зібрано"""
+        with self.lock:
+            self._append({"status": "complete", "output": str(output_path)})
+    
+    def load_render(self, output_path, output_format, video_path):
+        """План попереднього рендеру, якщо його доріжка і вихідний файл досі відповідають йому"""
+        if not os.path.exists(self.render_path):
+            return None
+        try:
+            with open(self.render_path, encoding='utf-8') as f:
+                render = json.load(f)
+            output = os.stat(output_path)
+            timeline_size = os.path.getsize(self.timeline_path)
+        except (OSError, ValueError):
+            return None
+        if (
+            (render["sample_rate"], render["channels"]) != (self.sample_rate, self.channels)
+            or (render["output"], render["format"], render["video"]) != (str(output_path), output_format, video_path)
+            # Файл змінили чи перезаписали після рендеру
+            or (render["output_size"], render["output_mtime"]) != (output.st_size, output.st_mtime_ns)
+            or timeline_size != render["total_samples"] * 4 * self.channels
+        ):
+            return None
+        return render
+    
+    def save_render(self, output_path, output_format, video_path, total_samples, slots):
+        """Запам'ятовує план рендеру (слоти [хеш тексту, початок, довжина]) і стан вихідного файлу"""
+        output = os.stat(output_path)
+        render = {
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "output": str(output_path),
+            "format": output_format,
+            "video": video_path,
+            "output_size": output.st_size,
+            "output_mtime": output.st_mtime_ns,
+            "total_samples": total_samples,
+            "cues": slots
+        }
+        temp_path = f"{self.render_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(render, f)
+        os.replace(temp_path, self.render_path)
+    
+    def clear_render(self):
+        """Скасовує план рендеру перед зміною доріжки: після збою буде повний рендер"""
+        if os.path.exists(self.render_path):
+            os.remove(self.render_path)
+
+def synthesize_audio(text, engine_type, voice_id):
+    """Озвучує текст без кешу: повертає сирий результат движка (байти, 'mp3' або 'wav')"""
+    if engine_type == "piper":
+        model_info = get_piper_models()[voice_id]
+        try:
+            engine = get_piper_engine(model_info["model"], model_info["config"])
+            pcm, sample_rate = engine.synthesize(text, model_info.get("speaker"))
+        except Exception as e:
+            raise Exception(f"Piper TTS помилка: {e}")
+        return pcm_to_wav_bytes(pcm, sample_rate), 'wav'
+    
+    if engine_type == "edge":
+        # Edge TTS віддає MP3 прямо в пам'ять
+        return get_edge_engine().synthesize(text, voice_id), 'mp3'
+    
+    if engine_type == "mms":
+        model, processor = load_mms_model()
+        waveform = mms_tts_synthesize_batch([text], model, processor)[0]
+        return pcm_to_wav_bytes(waveform, model.config.sampling_rate), 'wav'
+    
+    if engine_type == "espnet":
+        data = get_espnet_engine().synthesize(text, voice_id)
+        return data, espnet_audio_format(data)
+    
+    raise Exception(f"Невідомий движок: {engine_type}")
+
+def cached_synthesize(text, engine_type, voice_id):
+    """Озвучує текст через кеш: повертає (байти, формат)"""
+    cache = get_synthesis_cache()
+    key = cache.make_key(text, engine_type, voice_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    data, fmt = synthesize_audio(text, engine_type, voice_id)
+    cache.put(key, data, fmt)
+    return data, fmt
+
+def audio_bytes_to_clip(data, fmt, sample_rate=None, channels=None):
+    """Перетворює сирий результат движка на AudioClip у форматі таймлайну.
+    
+    WAV читається без FFmpeg; стиснене аудіо FFmpeg лише декодує. Частота і
+    канали в обох випадках змінюються один раз - у convert_pcm.
+    """
+    if fmt == 'wav':
+        try:
+            return convert_pcm(*wav_bytes_to_pcm(data), sample_rate, channels)
+        except ValueError:
+            # Рідкісний формат WAV (наприклад, 24-бітний) - декодуємо через FFmpeg
+            pass
+    return convert_pcm(*decode_audio_bytes(data), sample_rate, channels)
+
+def text_to_clip(text, engine_type, voice_id, sample_rate=None, channels=None):
+    """Озвучує текст і повертає AudioClip у форматі таймлайну"""
+    return audio_bytes_to_clip(*cached_synthesize(text, engine_type, voice_id), sample_rate, channels)
+
+def warm_up_engine(engine_type, voice_id):
+    """Завантажує модель движка заздалегідь, щоб перший субтитр не чекав на неї"""
+    if engine_type == "mms":
+        load_mms_model()
+    elif engine_type == "piper":
+        model_info = get_piper_models()[voice_id]
+        get_piper_engine(model_info["model"], model_info["config"])
+    elif engine_type == "edge":
+        get_edge_engine()
+    elif engine_type == "espnet":
+        get_espnet_engine().connect()
+
+class WarmupService:
+    """Прогрівання голосу у фоні, поки користувач ще налаштовує озвучку.
+    
+    Для обраного голосу завантажується модель движка і озвучується зразок для
+    прослуховування, тож кнопка "Прослухати" лише програє готовий файл. Робота
+    йде в одному фоновому потоці; якщо голос встигли змінити, поки запит
+    чекав у черзі, застарілий запит пропускається.
+    """
+    
+    def __init__(self):
+        self.preview_dir = tempfile.mkdtemp(prefix="srt_voice_preview_")
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+        # (движок, голос) -> Future зі шляхом до зразка
+        self.futures = {}
+        self.latest = None
+        self.lock = threading.Lock()
     
-    duration_ms = end_ms - start_ms
+    def request(self, engine_type, voice_id):
+        """Ставить голос у чергу прогрівання, повертає Future зі шляхом до зразка"""
+        key = (engine_type, voice_id)
+        with self.lock:
+            self.latest = key
+            future = self.futures.get(key)
+            # Пропущений або невдалий запит повторюємо
+            if future is None or (future.done() and (future.exception() is not None or future.result() is None)):
+                future = self.executor.submit(self._warm_up, key)
+                self.futures[key] = future
+            return future
     
-    return start_ms, end_ms, duration_ms
+    def _warm_up(self, key):
+        with self.lock:
+            if key != self.latest:
+                return None
+        engine_type, voice_id = key
+        with trace_span("warmup", engine=engine_type, voice=voice_id):
+            warm_up_engine(engine_type, voice_id)
+            data, fmt = cached_synthesize(PREVIEW_TEXT, engine_type, voice_id)
+        
+        name = hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(self.preview_dir, f"{name}.{fmt}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+    
+    def close(self):
+        """Зупиняє фоновий потік і видаляє зразки"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self.preview_dir, ignore_errors=True)
 
-def get_last_subtitle_end_time(subs):
-    """Отримує час закінчення останнього субтитру"""
-    if not subs:
-        return 0
-    last_sub = subs[-1]
-    _, end_ms, _ = get_timing_info(last_sub)
-    return end_ms
+def get_warmup_service():
+    global WARMUP_SERVICE
+    with WARMUP_SERVICE_LOCK:
+        if WARMUP_SERVICE is None:
+            WARMUP_SERVICE = WarmupService()
+            atexit.register(WARMUP_SERVICE.close)
+        return WARMUP_SERVICE
 
-async def edge_tts_synthesize(text, output_file, voice):
-    """Озвучує текст через Edge TTS"""
-    try:
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_file)
-        return True
-    except Exception as e:
-        raise Exception(f"Edge TTS помилка: {e}")
+def build_cues(subs):
+    """Готує список субтитрів для озвучки: номер, текст і тайминг"""
+    cues = []
+    for i, sub in enumerate(subs, 1):
+        start_ms, end_ms, duration_ms = get_timing_info(sub)
+        cues.append({
+            "index": i,
+            "text": sub.text.replace('\n', ' '),
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "duration_ms": duration_ms
+        })
+    return cues
+
+def get_engine_semaphore(engine_type):
+    """Повертає спільний семафор, що обмежує одночасні запити до движка"""
+    with ENGINE_SEMAPHORES_LOCK:
+        semaphore = ENGINE_SEMAPHORES.get(engine_type)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(ENGINE_CONCURRENCY.get(engine_type, 1))
+            ENGINE_SEMAPHORES[engine_type] = semaphore
+        return semaphore
+
+def synthesize_cue(cue, engine_type, voice_id, sample_rate=None, channels=None):
+    """Озвучує один субтитр (виконується в робочому потоці)"""
+    with get_engine_semaphore(engine_type):
+        with trace_span(f"synthesis.{engine_type}", cue=cue["index"], text_len=len(cue["text"])) as span:
+            clip = text_to_clip(cue["text"], engine_type, voice_id, sample_rate, channels)
+            span["audio_ms"] = round(clip.duration_ms)
+        return clip
+
+def synthesize_mms_cues(cues, voice_id, sample_rate=None, channels=None):
+    """Озвучує групу субтитрів MMS пакетами (з кешем)"""
+    cache = get_synthesis_cache()
+    keys = [cache.make_key(cue["text"], "mms", voice_id) for cue in cues]
+    raw = [cache.get(key) for key in keys]
+    missing = [i for i, item in enumerate(raw) if item is None]
+    
+    if missing:
+        model, processor = load_mms_model()
+        texts = [cues[i]["text"] for i in missing]
+        with get_engine_semaphore("mms"):
+            with trace_span("synthesis.mms", cue=cues[missing[0]]["index"], cues=len(texts), text_len=sum(map(len, texts))) as span:
+                waveforms = mms_tts_synthesize_batch(texts, model, processor)
+                span["audio_ms"] = round(sum(len(w) for w in waveforms) * 1000.0 / model.config.sampling_rate)
+        for i, waveform in zip(missing, waveforms):
+            raw[i] = (pcm_to_wav_bytes(waveform, model.config.sampling_rate), 'wav')
+            cache.put(keys[i], *raw[i])
+    
+    return [audio_bytes_to_clip(*item, sample_rate, channels) for item in raw]
 
-def piper_tts_synthesize(text, output_file, model_path, config_path, speaker_id=None):
-    """Озвучує текст через Piper TTS"""
+def synthesize_cue_group(cues, engine_type, voice_id, sample_rate=None, channels=None):
+    """Озвучує групу субтитрів: MMS - пакетами, інші движки - по одному"""
+    if engine_type == "mms":
+        return synthesize_mms_cues(cues, voice_id, sample_rate, channels)
+    return [synthesize_cue(cue, engine_type, voice_id, sample_rate, channels) for cue in cues]
+
+def synthesize_cues(cues, engine_type, voice_id, stop_flag, max_workers=None, on_done=None, sample_rate=None, channels=None):
+    """Озвучує субтитри пулом потоків і віддає (cue, future) строго в порядку SRT.
+    
+    Одночасно в роботі не більше ніж 2 * max_workers груп субтитрів, тому пам'ять
+    не росте з довжиною файлу. Після stop_flag нові субтитри не ставляться в чергу.
+    on_done(cue, future) викликається для кожного субтитру, щойно він готовий,
+    навіть якщо його ще не забрали з черги. Кліпи віддаються у форматі
+    sample_rate/channels (за замовчуванням - формат таймлайну).
+    """
+    if max_workers is None:
+        max_workers = max(ENGINE_CONCURRENCY.get(engine_type, 1), os.cpu_count() or 1)
+    # MMS виграє від пакетів, тому йому віддаємо субтитри великими групами
+    group_size = MMS_BATCH_WINDOW if engine_type == "mms" else 1
+    window = max_workers * 2 * group_size
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    cue_iter = iter(cues)
     try:
-        # Шукаємо piper.exe
-        piper_exe = None
-        possible_paths = [
-            "piper\\piper.exe",
-            "C:\\piper\\piper.exe",
-            os.path.expanduser("~\\piper\\piper.exe")
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                piper_exe = path
-                break
-        
-        if not piper_exe:
-            raise Exception("Piper.exe не знайдено! Встановіть Piper у папку 'piper' або 'C:\\piper'")
-        
-        # Piper створює WAV, тому спочатку створюємо тимчасовий WAV
-        temp_wav = output_file.replace('.mp3', '_temp.wav')
-        
-        cmd = [
-            piper_exe,
-            '--model', model_path,
-            '--config', config_path,
-            '--output_file', temp_wav
-        ]
-        
-        # Додаємо параметр speaker, якщо вказано
-        if speaker_id is not None:
-            cmd.extend(['--speaker', str(speaker_id)])
-        
-        process = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        stdout, stderr = process.communicate(input=text.encode('utf-8'))
-        
-        if process.returncode != 0:
-            raise Exception(f"Piper помилка: {stderr.decode()}")
-        
-        # Конвертуємо WAV в MP3 через FFmpeg
-        if os.path.exists(temp_wav):
-            convert_cmd = [
-                'ffmpeg', '-i', temp_wav, '-codec:a', 'libmp3lame',
-                '-qscale:a', '2', '-y', output_file
-            ]
-            subprocess.run(convert_cmd, capture_output=True, check=True)
+        while True:
+            while len(pending) < window and not stop_flag['stopped']:
+                group = list(itertools.islice(cue_iter, group_size))
+                if not group:
+                    break
+                group_future = executor.submit(contextvars.copy_context().run, synthesize_cue_group, group, engine_type, voice_id, sample_rate, channels)
+                cue_futures = [Future() for _ in group]
+                group_future.add_done_callback(
+                    lambda done, cue_futures=cue_futures: resolve_cue_futures(done, cue_futures)
+                )
+                if on_done is not None:
+                    for cue, future in zip(group, cue_futures):
+                        future.add_done_callback(lambda done, cue=cue: on_done(cue, done))
+                pending.extend(zip(group, cue_futures))
             
-            # Видаляємо тимчасовий WAV
-            os.remove(temp_wav)
-        else:
-            raise Exception("Piper не створив аудіофайл")
-        
-        return True
-    except Exception as e:
-        raise Exception(f"Piper TTS помилка: {e}")
+            if not pending:
+                break
+            yield pending.popleft()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def store_job_segment(job, cue, future):
+    """Зберігає готовий субтитр у завдання, щойно він озвучений"""
+    if not future.cancelled() and future.exception() is None:
+        job.store(cue, future.result())
 
-def mms_tts_synthesize(text, output_file, model=None, processor=None):
-    """Озвучує текст через MMS TTS"""
+def synthesize_job_cues(cues, job, engine_type, voice_id, stop_flag):
+    """Як synthesize_cues, але субтитри, вже готові в завданні, не озвучуються знову.
+    
+    Нові результати записуються в завдання одразу після озвучки, тому після
+    зупинки чи збою наступний запуск продовжить з того ж місця.
+    """
+    fresh = synthesize_cues(
+        [cue for cue in cues if not job.is_done(cue)], engine_type, voice_id, stop_flag,
+        on_done=lambda cue, future: store_job_segment(job, cue, future),
+        sample_rate=job.sample_rate, channels=job.channels
+    )
     try:
-        from transformers import VitsModel, AutoTokenizer
-        import torch
-        import scipy.io.wavfile
-        import numpy as np
-        
-        # Ініціалізація моделі (якщо ще не завантажена)
-        if model is None or processor is None:
-            model = VitsModel.from_pretrained("facebook/mms-tts-ukr")
-            processor = AutoTokenizer.from_pretrained("facebook/mms-tts-ukr")
-        
-        # Генерація аудіо
-        inputs = processor(text=text, return_tensors="pt")
-        
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        waveform = outputs.waveform[0].cpu().numpy()
-        
-        # Зберігаємо як WAV
-        temp_wav = output_file.replace('.mp3', '_temp_mms.wav')
-        scipy.io.wavfile.write(temp_wav, rate=16000, data=waveform)
-        
-        # Конвертуємо WAV в MP3
-        convert_cmd = [
-            'ffmpeg', '-i', temp_wav, '-codec:a', 'libmp3lame',
-            '-qscale:a', '2', '-y', output_file
-        ]
-        subprocess.run(convert_cmd, capture_output=True, check=True)
-        
-        # Видаляємо тимчасовий WAV
-        os.remove(temp_wav)
-        
-        return True
-    except Exception as e:
-        raise Exception(f"MMS TTS помилка: {e}")
+        # Запускаємо озвучку відсутніх, поки читаються готові сегменти
+        upcoming = next(fresh, None)
+        for cue in cues:
+            if upcoming is not None and upcoming[0] is cue:
+                future = upcoming[1]
+                upcoming = None
+                yield cue, future
+                upcoming = next(fresh, None)
+                continue
+            
+            if not job.is_done(cue):
+                # Озвучку зупинено - нових результатів більше не буде
+                return
+            future = Future()
+            try:
+                with trace_span("resume", cue=cue["index"]):
+                    future.set_result(job.load(cue))
+            except Exception as e:
+                future.set_exception(e)
+            yield cue, future
+    finally:
+        fresh.close()
 
-def espnet_tts_synthesize(text, output_file, speaker="female"):
-    """Озвучує текст через UA-ESPNET Gradio API"""
+def resolve_cue_futures(group_future, cue_futures):
+    """Розкладає результат групи по future окремих субтитрів"""
     try:
-        from gradio_client import Client
-        
-        # Підключаємося до Space
-        client = Client("robinhad/ukrainian-tts")
-        
-        # Викликаємо API без api_name (використовуємо перший endpoint)
-        result = client.predict(
-            text,  # text
-            speaker  # speaker
-        )
-        
-        # result може бути кортежем, беремо перший елемент
-        audio_path = result[0] if isinstance(result, tuple) else result
-        
-        if audio_path and os.path.exists(audio_path):
-            # Конвертуємо WAV в MP3
-            convert_cmd = [
-                'ffmpeg', '-i', audio_path, '-codec:a', 'libmp3lame',
-                '-qscale:a', '2', '-y', output_file
-            ]
-            subprocess.run(convert_cmd, capture_output=True, check=True)
-            return True
+        results = group_future.result()
+    except BaseException as e:
+        for future in cue_futures:
+            future.set_exception(e)
+        return
+    for future, result in zip(cue_futures, results):
+        future.set_result(result)
+
+class TimingPlanner:
+    """Прямий (покроковий) план таймінгу: субтитри подаються по порядку SRT.
+    
+    Усе в семплах. Субтитр, коротший за свій слот, розтягується до слоту (як і
+    раніше, не повільніше STRETCH_MIN_RATIO). Довший спочатку займає тишу до
+    наступного субтитру і лише потім стискається, не швидше STRETCH_MAX_RATIO;
+    залишок зсуває наступні субтитри. Для рішення потрібна лише довжина
+    поточного субтитру, тому план можна будувати під час потокового рендеру.
+    """
+    
+    def __init__(self, cues, sample_rate, total_samples=None):
+        self.starts = [ms_to_samples(cue["start_ms"], sample_rate) for cue in cues]
+        self.ends = [ms_to_samples(cue["end_ms"], sample_rate) for cue in cues]
+        self.total_samples = total_samples
+        self.tolerance = ms_to_samples(50, sample_rate)
+        self.index = 0
+        self.cursor = 0
+    
+    def place(self, natural):
+        """Планує наступний субтитр з природною довжиною natural: {"start", "length", "ratio"}"""
+        i = self.index
+        # Попередній субтитр міг зсунути цей пізніше його start
+        position = max(self.starts[i], self.cursor)
+        slot = self.ends[i] - self.starts[i]
+        if i + 1 < len(self.starts):
+            window_end = self.starts[i + 1]
         else:
-            raise Exception("API не повернув файл")
-            
-    except Exception as e:
-        raise Exception(f"UA-ESPNET помилка: {e}")
+            window_end = max(self.ends[i], self.total_samples or 0)
+        window = window_end - position
+        
+        if natural == 0 or abs(natural - slot) < self.tolerance:
+            length = natural
+        elif natural < slot:
+            length = min(slot, int(natural / STRETCH_MIN_RATIO))
+        elif natural <= window:
+            # Позичаємо тишу після субтитру замість стискання
+            length = natural
+        else:
+            length = max(window, int(np.ceil(natural / STRETCH_MAX_RATIO)))
+        
+        self.index += 1
+        self.cursor = position + length
+        return {
+            "start": position,
+            "length": length,
+            "ratio": natural / length if length else 1.0
+        }
 
-def text_to_speech(text, output_file, engine_type, voice_id):
-    """Універсальна функція озвучки"""
-    global MMS_MODEL, MMS_PROCESSOR
+def plan_timing(cues, natural_lengths, sample_rate, total_samples=None):
+    """Розраховує до збирання доріжки, де стоїть кожен субтитр і якої він довжини.
     
-    try:
-        if engine_type == "edge":
-            return asyncio.run(edge_tts_synthesize(text, output_file, voice_id))
-        elif engine_type == "piper":
-            model_info = PIPER_MODELS[voice_id]
-            return piper_tts_synthesize(
-                text, 
-                output_file, 
-                model_info["model"], 
-                model_info["config"],
-                model_info.get("speaker")
-            )
-        elif engine_type == "mms":
-            if MMS_MODEL is None:
-                from transformers import VitsModel, AutoTokenizer
-                MMS_MODEL = VitsModel.from_pretrained("facebook/mms-tts-ukr")
-                MMS_PROCESSOR = AutoTokenizer.from_pretrained("facebook/mms-tts-ukr")
-            return mms_tts_synthesize(text, output_file, MMS_MODEL, MMS_PROCESSOR)
-        elif engine_type == "espnet":
-            return espnet_tts_synthesize(text, output_file, voice_id)
-    except Exception as e:
-        raise e
+    Спочатку прямий прохід TimingPlanner. Якщо задано total_samples і озвучка в
+    неї не влазить, зворотний прохід спершу забирає тишу перед субтитрами, а потім
+    стискає їх ще, щоб кінець доріжки припав рівно на total_samples. Якщо не
+    влазить навіть на межі стискання, субтитри йдуть по черзі з найшвидшою
+    довжиною, а все після total_samples обрізається (як у потоковому рендері).
+    
+    Повертає (список {"start", "length", "ratio"}, довжина доріжки).
+    """
+    count = len(cues)
+    planner = TimingPlanner(cues, sample_rate, total_samples)
+    plan = [planner.place(natural) for natural in natural_lengths]
+    positions = [slot["start"] for slot in plan]
+    lengths = [slot["length"] for slot in plan]
+    fastest = [int(np.ceil(length / STRETCH_MAX_RATIO)) for length in natural_lengths]
+    
+    if total_samples is not None and planner.cursor > total_samples:
+        if sum(fastest) > total_samples:
+            # Не влазить навіть на межі стискання: субтитри не накладаються, кінець обрізає доріжка
+            cursor = 0
+            for i in range(count):
+                positions[i] = max(planner.starts[i], cursor)
+                lengths[i] = fastest[i]
+                cursor = positions[i] + lengths[i]
+        else:
+            # Зворотний прохід: озвучка має закінчитися не пізніше total_samples
+            forward_ends = [0] + [positions[i] + lengths[i] for i in range(count - 1)]
+            end_limit = total_samples
+            for i in reversed(range(count)):
+                overflow = positions[i] + lengths[i] - end_limit
+                if overflow > 0:
+                    # Спершу зсуваємо субтитр у тишу перед ним
+                    shift = min(overflow, max(positions[i] - forward_ends[i], 0))
+                    positions[i] -= shift
+                    overflow -= shift
+                if overflow > 0:
+                    # Потім стискаємо, але не швидше за межу
+                    lengths[i] = max(fastest[i], lengths[i] - overflow)
+                    positions[i] = max(0, min(positions[i], end_limit - lengths[i]))
+                end_limit = positions[i]
+                # Якщо попередній субтитр і так закінчується раніше - далі нічого не змінюється
+                if end_limit >= forward_ends[i]:
+                    break
+        
+        for i, natural in enumerate(natural_lengths):
+            plan[i] = {
+                "start": positions[i],
+                "length": lengths[i],
+                "ratio": natural / lengths[i] if lengths[i] else 1.0
+            }
+    
+    if total_samples is None:
+        total_samples = max([planner.ends[-1]] + [p["start"] + p["length"] for p in plan]) if plan else 0
+    return plan, total_samples
 
-def create_silence(duration_ms, output_file):
-    """Створює тихий аудіофайл заданої тривалості"""
-    if duration_ms <= 0:
-        return
-    duration_sec = duration_ms / 1000.0
-    cmd = [
-        'ffmpeg', '-f', 'lavfi', '-i', f'anullsrc=r=44100:cl=stereo',
-        '-t', str(duration_sec), '-q:a', '9', '-acodec', 'libmp3lame',
-        '-y', output_file
-    ]
-    subprocess.run(cmd, capture_output=True, check=True)
+def fit_clip_to_length(clip, num_samples):
+    """Розтягує або стискає фрагмент рівно до num_samples семплів"""
+    if clip.num_samples == num_samples:
+        return clip
+    return AudioClip(time_stretch(clip.pcm, num_samples, clip.sample_rate), clip.sample_rate)
 
-    # Перевірка тривалості тиші
-    probe_result = subprocess.run([
-        'ffprobe', '-v', 'error', '-show_entries', 
-        'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-        output_file
-    ], capture_output=True, text=True)
-    actual = float(probe_result.stdout.strip()) * 1000
-    print(f"DEBUG SILENCE: Потрібно {duration_ms:.0f}мс тиші, створено {actual:.0f}мс")
+def play_audio(file_path):
+    """Програє аудіофайл"""
+    if os.name == 'nt':
+        os.startfile(file_path)
 
-def adjust_audio_to_duration(input_file, output_file, target_duration_ms):
-    """Підганяє швидкість одного аудіофрагменту під потрібну тривалість"""
+def render_streaming(cues, job, engine_type, voice_id, output_path, target_duration_ms, progress_callback, log_callback, stop_flag, output_format=None, video_path=None):
+    """Озвучує субтитри і одразу дописує їх у файл, не тримаючи всю доріжку.
+    
+    У пам'яті лише вікно паралельної озвучки з synthesize_cues. План таймінгу
+    будується покроково (TimingPlanner), тому зворотного проходу немає: озвучка,
+    що не влізла в цільову тривалість, обрізається по ній.
+    """
+    sample_rate = job.sample_rate
+    target_samples = ms_to_samples(target_duration_ms, sample_rate) if target_duration_ms else None
+    planner = TimingPlanner(cues, sample_rate, target_samples)
+    with trace_span("encode"):
+        encoder = StreamingEncoder(str(output_path), sample_rate, job.channels, output_format, video_path)
+    finished = False
+    
     try:
-        # Отримуємо поточну тривалість
-        probe_cmd = [
-            'ffprobe', '-v', 'error', '-show_entries', 
-            'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_file
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
-        current_duration_ms = float(result.stdout.strip()) * 1000
-
-        print(f"DEBUG: Поточна: {current_duration_ms:.0f}мс, Потрібна: {target_duration_ms:.0f}мс, Різниця: {current_duration_ms - target_duration_ms:.0f}мс")
-        
-        # Якщо різниця менше 50мс, не чіпаємо
-        if abs(current_duration_ms - target_duration_ms) < 50:
-            if input_file != output_file:
-                shutil.copy(input_file, output_file)
-            return True
-        
-        target_duration_sec = target_duration_ms / 1000.0
-        current_duration_sec = current_duration_ms / 1000.0
-        speed_ratio = current_duration_sec / target_duration_sec
+        for cue, future in synthesize_job_cues(cues, job, engine_type, voice_id, stop_flag):
+            if stop_flag['stopped']:
+                log_callback("\n⚠ Обробку зупинено користувачем\n")
+                return False
+            
+            i = cue["index"]
+            progress_callback(int((i / len(cues)) * 100))
+            log_callback(f"[{i}/{len(cues)}] Обробка субтитру...\n")
+            
+            try:
+                with trace_span("synthesis.wait", cue=i):
+                    clip = future.result()
+            except Exception as e:
+                log_callback(f"✗ Помилка озвучки субтитру {i}: {e}\n")
+                return False
+            
+            slot = planner.place(clip.num_samples)
+            silence = slot["start"] - encoder.samples_written
+            if silence * 1000 >= sample_rate:
+                log_callback(f"  + Тиша: {silence * 1000.0 / sample_rate:.0f}мс\n")
+            if abs(slot["ratio"] - 1.0) > 0.01:
+                log_callback(f"  [{i}] швидкість x{slot['ratio']:.2f}\n")
+            
+            with trace_span("stretch", cue=i, ratio=round(slot["ratio"], 3), audio_ms=round(clip.duration_ms)):
+                pcm = fit_clip_to_length(clip, slot["length"]).pcm
+            if target_samples is not None:
+                # Все, що виходить за цільову тривалість, відкидається
+                pcm = pcm[:max(0, target_samples - slot["start"])]
+                silence = min(silence, target_samples - encoder.samples_written)
+            with trace_span("silence", duration_ms=round(max(silence, 0) * 1000.0 / sample_rate)):
+                encoder.write_silence(silence)
+            with trace_span("concat", cue=i):
+                encoder.write(pcm)
         
-        # Обмежуємо швидкість
-        if speed_ratio < 0.5 or speed_ratio > 2.0:
-            print(f"DEBUG: Співвідношення {speed_ratio:.2f} поза межами, копіюю без змін")
-            # Якщо не можемо підігнати, просто копіюємо
-            if input_file != output_file:
-                shutil.copy(input_file, output_file)
+        if stop_flag['stopped']:
+            log_callback("\n⚠ Обробку зупинено користувачем\n")
             return False
         
-        # Застосовуємо atempo
-        cmd = [
-            'ffmpeg', '-i', input_file,
-            '-filter:a', f'atempo={speed_ratio:.6f}',
-            '-codec:a', 'libmp3lame', '-q:a', '2',
-            '-y', output_file
-        ]
-        result = subprocess.run(cmd, capture_output=True, check=True)
-        print(f"DEBUG: Застосовано atempo={speed_ratio:.3f}")
-
-        # Перевірка результату
-        if os.path.exists(output_file):
-            probe_result = subprocess.run([
-                'ffprobe', '-v', 'error', '-show_entries', 
-                'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-                output_file
-            ], capture_output=True, text=True)
-            final_duration = float(probe_result.stdout.strip()) * 1000
-            print(f"DEBUG: Після корекції файл має {final_duration:.0f}мс (потрібно {target_duration_ms:.0f}мс)")
+        current_time = planner.cursor * 1000.0 / sample_rate
+        if target_samples is not None and planner.cursor > target_samples:
+            log_callback("\n⚠ Озвучка довша за відео навіть після стискання, кінець обрізано!\n")
+            log_callback(f"Останній субтитр: {current_time:.0f}мс ({current_time/1000:.1f}с)\n")
+        elif target_samples is not None:
+            log_callback(f"\nТиша в кінці: {target_duration_ms - current_time:.0f}мс\n")
+            with trace_span("silence", duration_ms=round(target_duration_ms - current_time)):
+                encoder.write_silence(target_samples - encoder.samples_written)
+        
+        with trace_span("encode"):
+            encoder.close()
+        finished = True
+        return True
+    finally:
+        if not finished:
+            # Незавершений файл не залишаємо
+            encoder.abort()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+def timeline_regions(changes, total_samples, merge_gap):
+    """Зливає змінені ділянки [початок, кінець) в упорядковані, обрізані по довжині доріжки.
+    
+    Ділянки, між якими менше merge_gap семплів, об'єднуються. Ділянка за кінцем
+    доріжки стає порожньою ділянкою на самому кінці - файл однаково треба
+    обрізати.
+    """
+    regions = []
+    for start, end in sorted((min(start, total_samples), min(end, total_samples)) for start, end in changes):
+        if end <= start and start < total_samples:
+            continue
+        if regions and start - regions[-1][1] < merge_gap:
+            regions[-1][1] = max(regions[-1][1], end)
         else:
-            print(f"DEBUG: ФАЙЛ НЕ СТВОРИВСЯ!")
+            regions.append([start, end])
+    return [tuple(region) for region in regions]
 
-        return True
-        
-    except Exception as e:
-        if input_file != output_file:
-            shutil.copy(input_file, output_file)
-        return False    
-
-def concatenate_audio_files(file_list, output_file):
-    """Об'єднує аудіофайли в один"""
-    list_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8')
-    for file in file_list:
-        escaped_path = file.replace('\\', '/').replace("'", "'\\''")
-        list_file.write(f"file '{escaped_path}'\n")
-    list_file.close()
+def render_incremental(cues, job, previous, engine_type, voice_id, output_path, target_duration_ms, progress_callback, log_callback, stop_flag, output_format, video_path=None):
+    """Переозвучує лише змінені субтитри і вклеює їх у доріжку попереднього рендеру.
     
-    cmd = [
-        'ffmpeg', '-f', 'concat', '-safe', '0',
-        '-i', list_file.name, '-c', 'copy', '-y', output_file
+    Нові й змінені тексти (за хешем у журналі завдання) озвучуються, для решти
+    природна довжина береться з журналу. План таймінгу рахується заново для
+    всього файлу, а перезбираються лише ділянки доріжки, де слоти (текст,
+    початок, довжина) відрізняються від попереднього плану. MP3 і WAV
+    перекодовуються лише на цих ділянках, решта форматів і відео - цілком,
+    але з готової доріжки.
+    """
+    sample_rate, channels = job.sample_rate, job.channels
+    missing = [cue for cue in cues if not job.is_done(cue)]
+    log_callback(f"Інкрементальна переозвучка: нових або змінених текстів {len(missing)} з {len(cues)}\n\n")
+    
+    fresh = {}
+    for done, (cue, future) in enumerate(synthesize_job_cues(missing, job, engine_type, voice_id, stop_flag), 1):
+        if stop_flag['stopped']:
+            log_callback("\n⚠ Обробку зупинено користувачем\n")
+            return False
+        progress_callback(int(done / len(missing) * 80))
+        log_callback(f"[{cue['index']}/{len(cues)}] Обробка субтитру...\n")
+        try:
+            with trace_span("synthesis.wait", cue=cue["index"]):
+                fresh[cue["index"]] = future.result()
+        except Exception as e:
+            log_callback(f"✗ Помилка озвучки субтитру {cue['index']}: {e}\n")
+            return False
+    if stop_flag['stopped']:
+        log_callback("\n⚠ Обробку зупинено користувачем\n")
+        return False
+    
+    natural_lengths = [
+        fresh[cue["index"]].num_samples if cue["index"] in fresh else job.entry(cue)["samples"]
+        for cue in cues
     ]
+    target_samples = ms_to_samples(target_duration_ms, sample_rate) if target_duration_ms else None
+    with trace_span("planning", cues=len(cues)):
+        plan, total_samples = plan_timing(cues, natural_lengths, sample_rate, target_samples)
+    slots = [[job.text_hash(cue), slot["start"], slot["length"]] for cue, slot in zip(cues, plan)]
+    if plan and plan[-1]["start"] + plan[-1]["length"] > total_samples:
+        log_callback("⚠ Озвучка довша за відео навіть після стискання, кінець обрізано!\n\n")
+    
+    # Слоти, яких не було в попередньому плані, і старі слоти, яких більше немає
+    old_slots = Counter(tuple(slot) for slot in previous["cues"])
+    new_slots = Counter(tuple(slot) for slot in slots)
+    changes = [(start, start + length) for _, start, length in ((old_slots - new_slots) + (new_slots - old_slots)).elements()]
+    if total_samples != previous["total_samples"]:
+        changes.append((min(total_samples, previous["total_samples"]), max(total_samples, previous["total_samples"])))
+    regions = timeline_regions(changes, total_samples, sample_rate * INCREMENTAL_MERGE_GAP_S)
+    
+    if regions:
+        timeline = MappedAudioTimeline(0, sample_rate, channels, path=job.timeline_path)
+        # Доріжка змінюється - до кінця кодування попередній план недійсний
+        job.clear_render()
+        try:
+            timeline.set_length(total_samples)
+            log_callback("\nЗбирання змінених ділянок доріжки...\n")
+            for start, end in regions:
+                log_callback(f"  {start / sample_rate:.1f}с - {end / sample_rate:.1f}с\n")
+                with trace_span("splice", start_ms=round(start * 1000.0 / sample_rate), duration_ms=round((end - start) * 1000.0 / sample_rate)):
+                    if end <= start:
+                        continue
+                    view = timeline.window(start, end - start)
+                    view[:] = 0
+                    for cue, slot in zip(cues, plan):
+                        lo, hi = max(slot["start"], start), min(slot["start"] + slot["length"], end)
+                        if lo >= hi:
+                            continue
+                        natural = fresh[cue["index"]] if cue["index"] in fresh else job.load(cue)
+                        clip = fit_clip_to_length(natural, slot["length"])
+                        view[lo - start:hi - start] += clip.pcm[lo - slot["start"]:hi - slot["start"]]
+                    view.flush()
+                    del view
+            progress_callback(90)
+            
+            log_callback("\nКодування змінених ділянок...\n")
+            with trace_span("encode", regions=len(regions)):
+                encoded_ms = None
+                try:
+                    if video_path is None and output_format == "mp3":
+                        encoded_ms = sum(reencode_mp3_region(str(output_path), timeline, start, end) for start, end in regions)
+                    elif video_path is None and output_format == "wav":
+                        encoded_ms = sum(patch_wav_region(str(output_path), timeline, start, end) for start, end in regions)
+                except ValueError as e:
+                    log_callback(f"⚠ Не вдалося перекодувати частково ({e}), кодую весь файл\n")
+                if encoded_ms is None:
+                    timeline.encode(str(output_path), output_format, video_path, spliceable=True)
+                    encoded_ms = timeline.duration_ms
+            log_callback(f"Перекодовано {encoded_ms / 1000:.1f}с з {timeline.duration_ms / 1000:.1f}с\n")
+        finally:
+            timeline.close()
+    else:
+        log_callback("\nДоріжка не змінилася, файл лишається як є\n")
+    
+    job.save_render(output_path, output_format, video_path, total_samples, slots)
+    job.mark_complete(output_path)
+    progress_callback(100)
+    file_size = os.path.getsize(output_path) / (1024 * 1024)
+    log_callback("\n✓ Готово!\n")
+    log_callback(f"Файл: {output_path}\n")
+    log_callback(f"Розмір: {file_size:.2f} МБ\n")
+    return True
+
+def process_srt_to_audio(srt_path, engine_type, voice_id, voice_name, target_duration_ms, progress_callback, log_callback, stop_flag, streaming=False, trace_path=None, disk_timeline=False, sample_rate=None, channels=None, output_format=None, video_path=None, incremental=False):
+    """Головна функція: озвучує SRT файл з таймінгом.
     
+    streaming=True пише MP3 по ходу озвучки, не тримаючи всі субтитри в пам'яті.
+    disk_timeline=True збирає доріжку у тимчасовому файлі на диску (memory map)
+    замість RAM - для повнометражних фільмів, коли потрібен повний план таймінгу.
+    sample_rate і channels задають формат доріжки завдання (за замовчуванням
+    44.1 кГц стерео); вихід будь-якого движка приводиться до нього одразу.
+    output_format - формат вихідного файлу (ключ OUTPUT_FORMATS, за замовчуванням
+    MP3); video_path - відео, у копію якого озвучка вбудовується замість
+    окремого аудіофайлу. Доріжка кодується лише один раз.
+    incremental=True зберігає доріжку і план рендеру в каталозі завдання, а при
+    наступному запуску після правки SRT переозвучує лише змінені субтитри і
+    перекодовує лише змінені ділянки (див. render_incremental).
+    trace_path (або каталог у змінній оточення SRT_VOICE_TRACE) вмикає трасування:
+    траса зберігається у форматі Chrome trace, а підсумок по етапах іде в лог.
+    """
+    return run_traced(
+        srt_path, trace_path, log_callback,
+        lambda: dub_srt_file(srt_path, engine_type, voice_id, voice_name, target_duration_ms, progress_callback, log_callback, stop_flag, streaming, disk_timeline, sample_rate, channels, output_format, video_path, incremental),
+        engine=engine_type, voice=voice_id, streaming=streaming, disk_timeline=disk_timeline, incremental=incremental
+    )
+
+def process_srt_to_voices(srt_path, voices, target_duration_ms, progress_callback, log_callback, stop_flag, streaming=False, trace_path=None, disk_timeline=False, sample_rate=None, channels=None, output_format=None, video_path=None, incremental=False):
+    """Озвучує один SRT файл кількома голосами за один прохід.
+    
+    voices - список (движок, ідентифікатор голосу, назва голосу). Файл
+    читається і розбирається один раз, голоси озвучуються одночасно, і для
+    кожного пишеться свій файл (див. voice_output_path). Решта параметрів - як
+    у process_srt_to_audio. Повертає {назва голосу: успіх}.
+    """
+    return run_traced(
+        srt_path, trace_path, log_callback,
+        lambda: render_voices(srt_path, voices, target_duration_ms, progress_callback, log_callback, stop_flag, streaming, disk_timeline, sample_rate, channels, output_format, video_path, incremental),
+        voices=[voice_id for _, voice_id, _ in voices], streaming=streaming, disk_timeline=disk_timeline, incremental=incremental
+    )
+
+def run_traced(srt_path, trace_path, log_callback, render, **run_args):
+    """Виконує render() з трасуванням, якщо воно ввімкнене (trace_path або SRT_VOICE_TRACE)"""
+    if trace_path is None and TRACE_DIR:
+        trace_path = os.path.join(TRACE_DIR, f"{Path(srt_path).stem}.trace.json")
+    if trace_path is None:
+        return render()
+    
+    tracer = Tracer()
+    token = TRACER.set(tracer)
     try:
-        subprocess.run(cmd, capture_output=True, check=True)
-        os.unlink(list_file.name)
-        return True
-    except subprocess.CalledProcessError:
-        os.unlink(list_file.name)
-        return False
+        with trace_span("run", file=os.path.basename(srt_path), **run_args):
+            return render()
+    finally:
+        TRACER.reset(token)
+        tracer.export_chrome(trace_path)
+        log_callback(f"\n--- Трасування ---\n{tracer.format_summary()}Траса: {trace_path}\n")
 
-def play_audio(file_path):
-    """Програє аудіофайл"""
-    if os.name == 'nt':
-        os.startfile(file_path)
+def load_subtitles(srt_path, log_callback):
+    """Читає SRT для озвучки; None, якщо файл не вдалося прочитати"""
+    with trace_span("parse", file=os.path.basename(srt_path)) as span:
+        subs = parse_srt_file(srt_path)
+        span["cues"] = len(subs) if subs else 0
+    if not subs:
+        log_callback("✗ Помилка читання файлу\n")
+        return None
+    
+    log_callback(f"✓ Завантажено {len(subs)} субтитрів\n\n")
+    return subs
 
-def process_srt_to_audio(srt_path, engine_type, voice_id, voice_name, target_duration_ms, progress_callback, log_callback, stop_flag):
-    """Головна функція: озвучує SRT файл з таймінгом"""
+def voice_output_path(srt_path, voice_name, output_format=None, video_path=None):
+    """Шлях до вихідного файлу поруч із SRT: "{коротке ім'я голосу} - {назва SRT}.mp3".
+    
+    Розширення задає формат, а при вбудовуванні у відео - контейнер відео.
+    """
+    short_voice_name = voice_name.split()[0]
+    extension = Path(video_path).suffix if video_path else OUTPUT_FORMATS[output_format or OUTPUT_FORMAT]["extension"]
+    return Path(srt_path).parent / f"{short_voice_name} - {Path(srt_path).stem}{extension}"
+
+def find_video_for_srt(srt_path):
+    """Відео з тією ж назвою, що й SRT, у тому ж каталозі (None, якщо немає)"""
+    for extension in VIDEO_EXTENSIONS:
+        for candidate in (Path(srt_path).with_suffix(extension), Path(srt_path).with_suffix(extension.upper())):
+            if candidate.exists():
+                return str(candidate)
+    return None
+
+def dub_srt_file(srt_path, engine_type, voice_id, voice_name, target_duration_ms, progress_callback, log_callback, stop_flag, streaming=False, disk_timeline=False, sample_rate=None, channels=None, output_format=None, video_path=None, incremental=False):
+    """Озвучка SRT файлу (див. process_srt_to_audio)"""
     log_callback(f"Обробка файлу: {os.path.basename(srt_path)}\n")
     log_callback(f"Движок: {'Edge TTS' if engine_type == 'edge' else 'Piper TTS'}\n")
     log_callback(f"Голос: {voice_name}\n\n")
     
-    subs = parse_srt_file(srt_path)
+    subs = load_subtitles(srt_path, log_callback)
     if not subs:
-        log_callback("✗ Помилка читання файлу\n")
         return False
+    return render_voice(
+        srt_path, subs, build_cues(subs), engine_type, voice_id, voice_name, target_duration_ms,
+        progress_callback, log_callback, stop_flag, streaming, disk_timeline, sample_rate, channels, output_format, video_path, incremental
+    )
+
+def render_voices(srt_path, voices, target_duration_ms, progress_callback, log_callback, stop_flag, streaming=False, disk_timeline=False, sample_rate=None, channels=None, output_format=None, video_path=None, incremental=False):
+    """Озвучка SRT файлу кількома голосами (див. process_srt_to_voices)"""
+    log_callback(f"Обробка файлу: {os.path.basename(srt_path)}\n")
+    log_callback(f"Голоси: {', '.join(voice_name for _, _, voice_name in voices)}\n\n")
     
-    log_callback(f"✓ Завантажено {len(subs)} субтитрів\n\n")
+    outputs = [voice_output_path(srt_path, voice_name, output_format, video_path) for _, _, voice_name in voices]
+    if len(set(outputs)) < len(outputs):
+        log_callback("✗ Кілька голосів пишуть в один файл (однакове коротке ім'я голосу)\n")
+        return {voice_name: False for _, _, voice_name in voices}
+    
+    subs = load_subtitles(srt_path, log_callback)
+    if not subs:
+        return {voice_name: False for _, _, voice_name in voices}
+    cues = build_cues(subs)
+    
+    # Загальний прогрес - середнє по голосах
+    progress = {voice_name: 0 for _, _, voice_name in voices}
+    progress_lock = threading.Lock()
+    
+    def voice_progress(voice_name):
+        def callback(percent):
+            with progress_lock:
+                progress[voice_name] = percent
+                total = sum(progress.values()) // len(progress)
+            progress_callback(total)
+        return callback
+    
+    def voice_log(voice_name):
+        prefix = f"[{voice_name.split()[0]}] "
+        def callback(message):
+            log_callback("".join(prefix + line if line.strip() else line for line in message.splitlines(True)))
+        return callback
     
-    temp_dir = tempfile.mkdtemp()
-    audio_files = []
-    current_time = 0
+    # Кожен голос - у своєму потоці зі своїм завданням і доріжкою; субтитри
+    # і розбір файлу спільні, а одночасні запити до движків обмежують їхні семафори
+    with ThreadPoolExecutor(max_workers=len(voices), thread_name_prefix="voice") as executor:
+        futures = {
+            voice_name: executor.submit(
+                contextvars.copy_context().run, render_voice, srt_path, subs, cues, engine_type, voice_id, voice_name, target_duration_ms,
+                voice_progress(voice_name), voice_log(voice_name), stop_flag,
+                streaming, disk_timeline, sample_rate, channels, output_format, video_path, incremental
+            )
+            for engine_type, voice_id, voice_name in voices
+        }
+    results = {voice_name: future.result() for voice_name, future in futures.items()}
+    
+    done = sum(results.values())
+    log_callback(f"\n{'✓' if done == len(results) else '⚠'} Озвучено голосів: {done} з {len(results)}\n")
+    return results
+
+def render_voice(srt_path, subs, cues, engine_type, voice_id, voice_name, target_duration_ms, progress_callback, log_callback, stop_flag, streaming=False, disk_timeline=False, sample_rate=None, channels=None, output_format=None, video_path=None, incremental=False):
+    """Озвучує вже розібрані субтитри одним голосом і пише файл цього голосу"""
+    cache_hits, cache_misses = get_synthesis_cache().stats()
+    output_format = output_format or OUTPUT_FORMAT
+    output_path = voice_output_path(srt_path, voice_name, output_format, video_path)
     
+    clips = []
+    natural_lengths = []
+    timeline = None
     try:
-        # Тиша на початку, якщо перший субтитр не з 0
-        if subs and len(subs) > 0:
-            first_start_ms, _, _ = get_timing_info(subs[0])
-            if first_start_ms > 0:
-                initial_silence_file = os.path.join(temp_dir, "silence_initial.mp3")
-                log_callback(f"Додавання тиші на початку: {first_start_ms}мс\n")
-                create_silence(first_start_ms, initial_silence_file)
-                audio_files.append(initial_silence_file)
-                current_time = first_start_ms
-                
-        for i, sub in enumerate(subs, 1):
+        # Завдання з попереднього (перерваного) запуску цього ж файлу цим голосом
+        job = JobManifest(srt_path, engine_type, voice_id, sample_rate=sample_rate, channels=channels)
+        resumed = sum(1 for cue in cues if job.is_done(cue))
+        if incremental:
+            previous = job.load_render(output_path, output_format, video_path)
+            if previous is not None:
+                return render_incremental(
+                    cues, job, previous, engine_type, voice_id, output_path, target_duration_ms,
+                    progress_callback, log_callback, stop_flag, output_format, video_path
+                )
+            log_callback("Попереднього рендеру немає: повна озвучка, доріжка зберігається для наступних правок\n\n")
+            if streaming:
+                log_callback("⚠ Потокове збирання несумісне з інкрементальною переозвучкою, вимкнено\n\n")
+                streaming = False
+        if resumed:
+            log_callback(f"↻ Відновлено {resumed} з {len(cues)} вже озвучених субтитрів\n\n")
+        
+        if streaming:
+            log_callback("Потокове збирання: файл пишеться під час озвучки\n\n")
+            if not render_streaming(cues, job, engine_type, voice_id, output_path, target_duration_ms, progress_callback, log_callback, stop_flag, output_format, video_path):
+                return False
+            job.mark_complete(output_path)
+            file_size = os.path.getsize(output_path) / (1024 * 1024)
+            log_callback("\n✓ Готово!\n")
+            log_callback(f"Файл: {output_path}\n")
+            log_callback(f"Розмір: {file_size:.2f} МБ\n")
+            return True
+        
+        sample_rate, channels = job.sample_rate, job.channels
+        if disk_timeline:
+            # Доріжка одразу розміром до кінця останнього субтитру або відео
+            timeline_ms = max(get_last_subtitle_end_time(subs), target_duration_ms or 0)
+            log_callback(f"Доріжка на диску: {timeline_ms / 1000:.0f}с у {TIMELINE_SCRATCH_DIR or tempfile.gettempdir()}\n\n")
+            clips = ClipSpool(sample_rate, channels, scratch_dir=TIMELINE_SCRATCH_DIR)
+            timeline = MappedAudioTimeline(timeline_ms, sample_rate, channels, scratch_dir=TIMELINE_SCRATCH_DIR)
+        if incremental:
+            # Доріжка збирається одразу в каталозі завдання і лишається там
+            job.clear_render()
+            if timeline is not None:
+                timeline.close()
+            os.makedirs(job.job_dir, exist_ok=True)
+            if os.path.exists(job.timeline_path):
+                os.remove(job.timeline_path)
+            timeline = MappedAudioTimeline(0, sample_rate, channels, path=job.timeline_path)
+        
+        # Субтитри озвучуються паралельно, а результати збираються по порядку
+        for cue, future in synthesize_job_cues(cues, job, engine_type, voice_id, stop_flag):
             # Перевірка на зупинку
             if stop_flag['stopped']:
                 log_callback("\n⚠ Обробку зупинено користувачем\n")
                 return False
             
-            progress = int((i / len(subs)) * 100)
+            i = cue["index"]
+            progress = int((i / len(cues)) * 100)
             progress_callback(progress)
-            log_callback(f"[{i}/{len(subs)}] Обробка субтитру...\n")
-            
-            start_ms, end_ms, duration_ms = get_timing_info(sub)
-            
-            # Додаємо тишу ПЕРЕД субтитром, якщо є пауза
-            if start_ms > current_time:
-                silence_duration = start_ms - current_time
-                silence_file = os.path.join(temp_dir, f"silence_{i:04d}.mp3")
-                log_callback(f"  + Тиша: {silence_duration}мс\n")
-                create_silence(silence_duration, silence_file)
-                audio_files.append(silence_file)
-            
-            # Озвучуємо текст субтитру
-            text = sub.text.replace('\n', ' ')
-            audio_file_temp = os.path.join(temp_dir, f"audio_{i:04d}_temp.mp3")
-            audio_file = os.path.join(temp_dir, f"audio_{i:04d}.mp3")
+            log_callback(f"[{i}/{len(cues)}] Обробка субтитру...\n")
             
             try:
-                if text_to_speech(text, audio_file_temp, engine_type, voice_id):
-                    # Підганяємо тривалість озвучки під тайминг субтитру
-                    adjust_audio_to_duration(audio_file_temp, audio_file, duration_ms)
-                    audio_files.append(audio_file)  # <-- Тут має бути audio_file, НЕ audio_file_temp
-                    
-                    # Перевірка чи створився скоригований файл
-                    if not os.path.exists(audio_file):
-                        print(f"ПОМИЛКА: Скоригований файл не створився, використовую оригінал")
-                        shutil.copy(audio_file_temp, audio_file)
-                    
-                    # Видаляємо тимчасовий файл
-                    if os.path.exists(audio_file_temp):
-                        os.remove(audio_file_temp)
-                    
-                    current_time = end_ms
+                with trace_span("synthesis.wait", cue=i):
+                    clip = future.result()
+                clips.append(clip)
+                natural_lengths.append(clip.num_samples)
             except Exception as e:
                 log_callback(f"✗ Помилка озвучки субтитру {i}: {e}\n")
                 return False        
         
-        # Додаємо тишу В КІНЦІ, якщо вказана цільова тривалість
+        if stop_flag['stopped']:
+            log_callback("\n⚠ Обробку зупинено користувачем\n")
+            return False
+        
+        hits, misses = get_synthesis_cache().stats()
+        log_callback(f"\nКеш озвучки: {hits - cache_hits} влучань, {misses - cache_misses} промахів\n")
+        
+        # План таймінгу для всього файлу: позиції та швидкості всіх субтитрів наперед
+        target_samples = ms_to_samples(target_duration_ms, sample_rate) if target_duration_ms else None
+        with trace_span("planning", cues=len(cues)):
+            plan, total_samples = plan_timing(cues, natural_lengths, sample_rate, target_samples)
+        
+        log_callback("\nЗбирання аудіодоріжки...\n")
+        if timeline is None:
+            timeline = AudioTimeline(0, sample_rate, channels)
+        with trace_span("silence", duration_ms=round(total_samples * 1000.0 / sample_rate)):
+            timeline.set_length(total_samples)
+        current_time = 0
+        
+        for cue, slot in zip(cues, plan):
+            start_ms = slot["start"] * 1000.0 / sample_rate
+            
+            # Тиша перед субтитром - це просто нулі в доріжці
+            if start_ms - current_time >= 1:
+                log_callback(f"  + Тиша: {start_ms - current_time:.0f}мс\n")
+            if abs(slot["ratio"] - 1.0) > 0.01:
+                log_callback(f"  [{cue['index']}] швидкість x{slot['ratio']:.2f}\n")
+            
+            natural = clips[cue["index"] - 1]
+            with trace_span("stretch", cue=cue["index"], ratio=round(slot["ratio"], 3), audio_ms=round(natural.duration_ms)):
+                clip = fit_clip_to_length(natural, slot["length"])
+            clips[cue["index"] - 1] = None
+            with trace_span("concat", cue=cue["index"]):
+                timeline.place_at(slot["start"], clip)
+            current_time = (slot["start"] + slot["length"]) * 1000.0 / sample_rate
+        
+        # Озвучка, що не влізла навіть після стискання, обрізається по цільовій тривалості
+        timeline.set_length(total_samples)
+        
+        # Тиша В КІНЦІ до цільової тривалості
         if target_duration_ms and target_duration_ms > current_time:
             final_silence_duration = target_duration_ms - current_time
-            final_silence_file = os.path.join(temp_dir, "silence_final.mp3")
             
             # Детальне логування
             log_callback(f"\n--- Розрахунок фінальної тиші ---\n")
-            log_callback(f"Останній субтитр закінчився в: {current_time}мс ({current_time/1000:.1f}с)\n")
+            log_callback(f"Останній субтитр закінчився в: {current_time:.0f}мс ({current_time/1000:.1f}с)\n")
             log_callback(f"Цільова тривалість відео: {target_duration_ms}мс ({target_duration_ms/1000:.1f}с)\n")
-            log_callback(f"Потрібно додати тиші: {final_silence_duration}мс ({final_silence_duration/1000:.1f}с)\n")
-            
-            create_silence(final_silence_duration, final_silence_file)
-            audio_files.append(final_silence_file)
+            log_callback(f"Потрібно додати тиші: {final_silence_duration:.0f}мс ({final_silence_duration/1000:.1f}с)\n")
         elif target_duration_ms:
-            log_callback(f"\n⚠ Озвучка довша за відео!\n")
-            log_callback(f"Останній субтитр: {current_time}мс ({current_time/1000:.1f}с)\n")
+            log_callback("\n⚠ Озвучка довша за відео навіть після стискання, кінець обрізано!\n")
+            log_callback(f"Останній субтитр: {current_time:.0f}мс ({current_time/1000:.1f}с)\n")
             log_callback(f"Цільова тривалість: {target_duration_ms}мс ({target_duration_ms/1000:.1f}с)\n")
         
-        if stop_flag['stopped']:
-            log_callback("\n⚠ Обробку зупинено користувачем\n")
-            return False
-        
-        log_callback("\nОб'єднання аудіофрагментів...\n")
-        
-        # Створюємо назву файлу з ім'ям голосу
-        base_name = Path(srt_path).stem
-        parent_dir = Path(srt_path).parent
-        short_voice_name = voice_name.split()[0]
-        output_filename = f"{short_voice_name} - {base_name}.mp3"
-        output_path = parent_dir / output_filename
+        log_callback("\nКодування аудіодоріжки...\n")
         
-        if concatenate_audio_files(audio_files, str(output_path)):
-            # Якщо вказана цільова тривалість, робимо фінальну корекцію
-            if target_duration_ms and target_duration_ms > 0:
-                log_callback("\nФінальна корекція тривалості...\n")
-                
-                # Перевіряємо поточну тривалість
-                probe_cmd = [
-                    'ffprobe', '-v', 'error', '-show_entries', 
-                    'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-                    str(output_path)
-                ]
-                result = subprocess.run(probe_cmd, capture_output=True, text=True)
-                current_duration_sec = float(result.stdout.strip())
-                current_duration_ms = current_duration_sec * 1000
-                
-                target_duration_sec = target_duration_ms / 1000.0
-                
-                # Якщо різниця більше 0.5 секунди, коригуємо
-                diff_sec = abs(current_duration_sec - target_duration_sec)
-                if diff_sec > 0.5:
-                    log_callback(f"Поточна тривалість: {current_duration_sec:.1f}с, цільова: {target_duration_sec:.1f}с\n")
-                    log_callback(f"Різниця: {diff_sec:.1f}с, застосовую корекцію...\n")
-                    
-                    # Створюємо тимчасову копію
-                    temp_path = str(output_path).replace('.mp3', '_before_final_correction.mp3')
-                    os.rename(str(output_path), temp_path)
-                    
-                    # Розраховуємо коефіцієнт
-                    speed_ratio = current_duration_sec / target_duration_sec
-                    
-                    if 0.5 <= speed_ratio <= 2.0:
-                        # ПРОХІД 1: Застосовуємо корекцію
-                        cmd = [
-                            'ffmpeg', '-i', temp_path,
-                            '-filter:a', f'atempo={speed_ratio:.6f}',
-                            '-codec:a', 'libmp3lame', '-q:a', '2',
-                            '-y', str(output_path)
-                        ]
-                        subprocess.run(cmd, capture_output=True, check=True)
-                        
-                        # Перевіряємо результат першого проходу
-                        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-                        after_first_pass = float(result.stdout.strip())
-                        log_callback(f"Після першого проходу: {after_first_pass:.1f}с\n")
-                        
-                        # ПРОХІД 2: Якщо різниця ще є, коригуємо знову
-                        second_diff = abs(after_first_pass - target_duration_sec)
-                        if second_diff > 1.0 and 0.5 <= (after_first_pass / target_duration_sec) <= 2.0:
-                            log_callback(f"Різниця {second_diff:.1f}с, другий прохід корекції...\n")
-                            
-                            temp_path2 = str(output_path).replace('.mp3', '_temp2.mp3')
-                            os.rename(str(output_path), temp_path2)
-                            
-                            speed_ratio2 = after_first_pass / target_duration_sec
-                            cmd2 = [
-                                'ffmpeg', '-i', temp_path2,
-                                '-filter:a', f'atempo={speed_ratio2:.6f}',
-                                '-codec:a', 'libmp3lame', '-q:a', '2',
-                                '-y', str(output_path)
-                            ]
-                            subprocess.run(cmd2, capture_output=True, check=True)
-                            os.remove(temp_path2)
-                            
-                            result = subprocess.run(probe_cmd, capture_output=True, text=True)
-                            after_second_pass = float(result.stdout.strip())
-                            log_callback(f"Після другого проходу: {after_second_pass:.1f}с\n")
-                        
-                        # Показуємо фінальний результат
-                        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-                        final_duration_sec = float(result.stdout.strip())
-                        final_diff = abs(final_duration_sec - target_duration_sec)
-                        
-                        log_callback(f"✓ Фінальна тривалість: {final_duration_sec:.1f}с (різниця: {final_diff:.1f}с)\n")
-                        os.remove(temp_path)
-                    else:
-                        log_callback(f"⚠ Коефіцієнт {speed_ratio:.2f}x поза межами, залишаю як є\n")
-                        os.rename(temp_path, str(output_path))
-                else:
-                    log_callback(f"✓ Тривалість в межах норми (різниця {diff_sec:.1f}с)\n")
-            
+        # Доріжка вже має точну цільову довжину, тому кодуємо один раз без фінальної корекції
+        with trace_span("encode", duration_ms=round(timeline.duration_ms)):
+            encoded = timeline.encode(str(output_path), output_format, video_path, spliceable=incremental)
+        if encoded:
+            if incremental:
+                slots = [[job.text_hash(cue), slot["start"], slot["length"]] for cue, slot in zip(cues, plan)]
+                job.save_render(output_path, output_format, video_path, total_samples, slots)
+            job.mark_complete(output_path)
             file_size = os.path.getsize(output_path) / (1024 * 1024)
             
-            # Показуємо фінальну тривалість
-            probe_cmd = [
-                'ffprobe', '-v', 'error', '-show_entries', 
-                'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-                str(output_path)
-            ]
-            result = subprocess.run(probe_cmd, capture_output=True, text=True)
-            actual_duration_sec = float(result.stdout.strip())
+            actual_duration_sec = timeline.duration_ms / 1000.0
             actual_min = int(actual_duration_sec // 60)
             actual_sec = int(actual_duration_sec % 60)
             
@@ -592,17 +3150,19 @@ def process_srt_to_audio(srt_path, engine_type, voice_id, voice_name, target_dur
         log_callback(f"\n✗ Критична помилка: {e}\n")
         return False
     finally:
-        shutil.rmtree(temp_dir)
+        if isinstance(clips, ClipSpool):
+            clips.close()
+        if timeline is not None:
+            timeline.close()
 
 class SRTVoiceApp:
     def __init__(self, root):
         self.root = root
         self.root.title("SRT Voice App - Українська озвучка")
-        self.root.geometry("750x700")
+        self.root.geometry("750x730")
         self.root.resizable(False, False)
         
         self.srt_file = None
-        self.preview_file = None
         self.stop_flag = {'stopped': False}
         self.processing = False
         
@@ -637,14 +3197,16 @@ class SRTVoiceApp:
                                 command=self.update_voice_list)
         edge_rb.pack(side=tk.LEFT, padx=10)
 
-        if PIPER_MODELS:
-            piper_rb = tk.Radiobutton(engine_frame, text="Piper TTS (офлайн)", 
-                                    variable=self.engine_var, value="piper",
-                                    command=self.update_voice_list)
-            piper_rb.pack(side=tk.LEFT, padx=10)
-        else:
-            piper_label = tk.Label(engine_frame, text="(Piper моделі не знайдено)", fg="gray")
-            piper_label.pack(side=tk.LEFT, padx=10)
+        # Місце для Piper: кнопка або підказка, залежно від знайдених моделей
+        piper_slot = tk.Frame(engine_frame)
+        piper_slot.pack(side=tk.LEFT)
+        self.piper_rb = tk.Radiobutton(piper_slot, text="Piper TTS (офлайн)", 
+                                       variable=self.engine_var, value="piper",
+                                       command=self.update_voice_list)
+        self.piper_label = tk.Label(piper_slot, text="(Piper моделі не знайдено)", fg="gray")
+        # Список моделей з індексу без перевірки; актуальність перевіряється у фоні після показу вікна
+        load_piper_models(refresh=False)
+        self.update_piper_button()
 
         mms_rb = tk.Radiobutton(engine_frame, text="MMS TTS (Meta)", 
                             variable=self.engine_var, value="mms",
@@ -678,6 +3240,35 @@ class SRTVoiceApp:
         
         tk.Label(duration_frame, text="  (для додавання тиші в кінці)", fg="gray").pack(side=tk.LEFT)
         
+        # Потокове збирання для довгих файлів
+        streaming_frame = tk.Frame(root)
+        streaming_frame.pack(pady=(0, 5), padx=20, fill=tk.X)
+        
+        self.streaming_var = tk.BooleanVar(value=False)
+        streaming_cb = tk.Checkbutton(streaming_frame, text="Потокове збирання (для дуже довгих файлів)",
+                                      variable=self.streaming_var)
+        streaming_cb.pack(side=tk.LEFT)
+        
+        self.incremental_var = tk.BooleanVar(value=False)
+        incremental_cb = tk.Checkbutton(streaming_frame, text="Переозвучувати лише змінені субтитри",
+                                        variable=self.incremental_var)
+        incremental_cb.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Формат результату і вбудовування у відео
+        output_frame = tk.Frame(root)
+        output_frame.pack(pady=(0, 5), padx=20, fill=tk.X)
+        
+        tk.Label(output_frame, text="Формат:", font=("Arial", 10, "bold")).pack(side=tk.LEFT)
+        self.format_var = tk.StringVar(value=OUTPUT_FORMAT)
+        format_menu = ttk.Combobox(output_frame, textvariable=self.format_var, values=list(OUTPUT_FORMATS),
+                                   state="readonly", width=6)
+        format_menu.pack(side=tk.LEFT, padx=10)
+        
+        self.mux_video_var = tk.BooleanVar(value=False)
+        mux_video_cb = tk.Checkbutton(output_frame, text="Вбудувати у відео з тією ж назвою, що й SRT",
+                                      variable=self.mux_video_var)
+        mux_video_cb.pack(side=tk.LEFT)
+        
         # Вибір голосу
         voice_frame = tk.Frame(root)
         voice_frame.pack(pady=10, padx=20, fill=tk.X)
@@ -689,6 +3280,7 @@ class SRTVoiceApp:
         self.voice_menu = ttk.Combobox(voice_frame, textvariable=self.voice_var, 
                                        state="readonly", width=30)
         self.voice_menu.pack(side=tk.LEFT, padx=10)
+        self.voice_menu.bind("<<ComboboxSelected>>", lambda event: self.warm_up_voice())
         
         preview_button = tk.Button(voice_frame, text="🔊 Прослухати", 
                                    command=self.preview_voice, width=12)
@@ -696,6 +3288,7 @@ class SRTVoiceApp:
         
         # Оновлюємо список голосів
         self.update_voice_list()
+        self.root.after(100, self.refresh_piper_models)
         
         # Кнопки запуску та зупинки
         buttons_frame = tk.Frame(root)
@@ -730,24 +3323,48 @@ class SRTVoiceApp:
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.log_text.yview)
     
+    def update_piper_button(self):
+        """Показує кнопку Piper, якщо моделі є, інакше - підказку"""
+        if get_piper_models():
+            self.piper_label.pack_forget()
+            self.piper_rb.pack(side=tk.LEFT, padx=10)
+        else:
+            self.piper_rb.pack_forget()
+            self.piper_label.pack(side=tk.LEFT, padx=10)
+    
+    def refresh_piper_models(self):
+        """Перевіряє індекс Piper моделей у фоні та оновлює інтерфейс, якщо щось змінилось"""
+        def refresh_thread():
+            if load_piper_models(refresh=True):
+                self.root.after(0, self.on_piper_models_changed)
+        
+        threading.Thread(target=refresh_thread, daemon=True).start()
+    
+    def on_piper_models_changed(self):
+        self.update_piper_button()
+        if self.engine_var.get() == "piper":
+            if not get_piper_models():
+                self.engine_var.set("edge")
+            self.update_voice_list()
+    
     def update_voice_list(self):
         """Оновлює список голосів залежно від обраного движка"""
         engine = self.engine_var.get()
-        
-        if engine == "edge":
-            voices = list(EDGE_VOICES.keys())
-        elif engine == "piper":
-            voices = list(PIPER_MODELS.keys())
-        elif engine == "mms":
-            voices = list(MMS_VOICE.keys())
-        elif engine == "espnet":
-            voices = list(ESPNET_VOICES.keys())
-        else:
-            voices = []
+        voices = get_voice_names(engine)
         
         self.voice_menu['values'] = voices
         if voices:
             self.voice_var.set(voices[0])
+            self.warm_up_voice()
+    
+    def warm_up_voice(self):
+        """Починає у фоні завантаження моделі та зразок обраного голосу"""
+        engine = self.engine_var.get()
+        try:
+            voice_id = get_voice_id(engine, self.voice_var.get())
+        except KeyError:
+            return
+        get_warmup_service().request(engine, voice_id)
     
     def select_file(self):
         file_paths = filedialog.askopenfilenames(
@@ -863,31 +3480,18 @@ class SRTVoiceApp:
             messagebox.showwarning("Увага", "Оберіть голос!")
             return
         
-        self.log(f"Створення прослуховування: {voice_name}...\n")
-        
-        if self.preview_file and os.path.exists(self.preview_file):
-            try:
-                os.remove(self.preview_file)
-            except:
-                pass
-        
-        self.preview_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3').name
-        sample_text = "Привіт! Це приклад озвучки. Так звучатиме ваш текст."
-        
         def preview_thread():
             try:
-                if engine == "edge":
-                    voice_id = EDGE_VOICES[voice_name]
-                elif engine == "mms":
-                    voice_id = MMS_VOICE[voice_name]
-                elif engine == "espnet":
-                    voice_id = ESPNET_VOICES[voice_name]
-                else:
-                    voice_id = voice_name
+                voice_id = get_voice_id(engine, voice_name)
                 
-                if text_to_speech(sample_text, self.preview_file, engine, voice_id):
+                # Зразок зазвичай уже озвучений фоновим прогріванням
+                future = get_warmup_service().request(engine, voice_id)
+                if not future.done():
+                    self.log(f"Створення прослуховування: {voice_name}...\n")
+                preview_file = future.result()
+                if preview_file:
                     self.log(f"✓ Програю зразок голосу...\n")
-                    play_audio(self.preview_file)
+                    play_audio(preview_file)
                 else:
                     self.root.after(0, lambda: messagebox.showerror("Помилка", 
                                     "Не вдалося створити прослуховування"))
@@ -946,14 +3550,7 @@ class SRTVoiceApp:
         engine = self.engine_var.get()
         voice_name = self.voice_var.get()
         
-        if engine == "edge":
-            voice_id = EDGE_VOICES[voice_name]
-        elif engine == "mms":
-            voice_id = MMS_VOICE[voice_name]
-        elif engine == "espnet":
-            voice_id = ESPNET_VOICES[voice_name]
-        else:
-            voice_id = voice_name
+        voice_id = get_voice_id(engine, voice_name)
         
         thread = threading.Thread(target=self.process_thread, args=(engine, voice_id, voice_name, durations_dict))
         thread.start()
@@ -981,6 +3578,12 @@ class SRTVoiceApp:
                 # Отримуємо тривалість для цього файлу
                 target_duration_ms = durations_dict.get(srt_file, None)
                 
+                video_path = None
+                if self.mux_video_var.get():
+                    video_path = find_video_for_srt(srt_file)
+                    if video_path is None:
+                        self.root.after(0, lambda: self.log("⚠ Відео поруч із SRT не знайдено, зберігаю лише аудіо\n"))
+                
                 success = process_srt_to_audio(
                     srt_file,
                     engine,
@@ -989,7 +3592,11 @@ class SRTVoiceApp:
                     target_duration_ms,
                     self.update_progress,
                     self.log,
-                    self.stop_flag
+                    self.stop_flag,
+                    streaming=self.streaming_var.get(),
+                    output_format=self.format_var.get(),
+                    video_path=video_path,
+                    incremental=self.incremental_var.get()
                 )
                 
                 if success:
@@ -1013,15 +3620,16 @@ class SRTVoiceApp:
         self.processing = False
         self.root.after(0, lambda: self.start_button.config(state=tk.NORMAL, text="▶ Запустити озвучку"))
         self.root.after(0, lambda: self.stop_button.config(state=tk.DISABLED, text="⬛ Зупинити"))
-    
-    def __del__(self):
-        if self.preview_file and os.path.exists(self.preview_file):
-            try:
-                os.remove(self.preview_file)
-            except:
-                pass
 
-if __name__ == "__main__":
+def run_gui():
+    """Запускає графічний інтерфейс (tkinter імпортується лише тут)"""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import filedialog, ttk, messagebox
+    
     root = tk.Tk()
     app = SRTVoiceApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+if __name__ == "__main__":
+    run_gui()
\ No newline at end of file
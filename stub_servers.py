@@ -0,0 +1,271 @@
+"""Локальні заглушки онлайн TTS сервісів для тестів і бенчмарків без інтернету.
+
+Запуск:
+    python stub_servers.py edge --port 8765
+    python stub_servers.py espnet --port 7860
+
+Після цього main.py треба запускати зі змінною оточення
+EDGE_TTS_URL=ws://127.0.0.1:8765/edge/v1?TrustedClientToken=stub
+або ESPNET_URL=http://127.0.0.1:7860/
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import re
+import struct
+import subprocess
+import tempfile
+import uuid
+import wave
+
+from aiohttp import web, WSMsgType
+
+# Скільки мілісекунд "мовлення" заглушка генерує на один символ тексту
+MS_PER_CHAR = 60
+
+def make_tone_mp3(duration_ms, sample_rate=24000):
+    """Генерує MP3 з тоном заданої тривалості (як audio-24khz-48kbitrate-mono-mp3)"""
+    cmd = [
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', f'sine=frequency=220:sample_rate={sample_rate}:duration={duration_ms / 1000.0}',
+        '-ac', '1', '-codec:a', 'libmp3lame', '-b:a', '48k', '-f', 'mp3', '-'
+    ]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+def edge_text_message(request_id, path, body="{}"):
+    """Текстове повідомлення протоколу Edge: заголовки, порожній рядок, тіло"""
+    return (
+        f"X-RequestId:{request_id}\r\n"
+        "Content-Type:application/json; charset=utf-8\r\n"
+        f"Path:{path}\r\n\r\n"
+        f"{body}"
+    )
+
+def edge_audio_message(request_id, data):
+    """Бінарне повідомлення: 2 байти довжини заголовка, заголовок, MP3 дані"""
+    header = (
+        f"X-RequestId:{request_id}\r\n"
+        "Content-Type:audio/mpeg\r\n"
+        "Path:audio\r\n"
+    ).encode('utf-8')
+    return len(header).to_bytes(2, "big") + header + data
+
+async def edge_handler(request):
+    """Імітує websocket синтезу Edge TTS: speech.config, ssml -> turn.start, audio, turn.end"""
+    websocket = web.WebSocketResponse()
+    await websocket.prepare(request)
+    tones = request.app["tones"]
+
+    async for message in websocket:
+        if message.type != WSMsgType.TEXT:
+            continue
+        if "Path:ssml" not in message.data:
+            continue
+
+        request_id = uuid.uuid4().hex
+        match = re.search(r"<prosody[^>]*>(.*)</prosody>", message.data, re.S)
+        text = match.group(1) if match else ""
+        duration_ms = max(200, len(text) * MS_PER_CHAR)
+
+        # Однакові за довжиною тексти отримують той самий MP3
+        if duration_ms not in tones:
+            tones[duration_ms] = make_tone_mp3(duration_ms)
+        audio = tones[duration_ms]
+
+        await websocket.send_str(edge_text_message(request_id, "turn.start", '{"context":{"serviceTag":"stub"}}'))
+        # Справжній сервіс ріже аудіо на шматки приблизно по 4 КБ
+        for start in range(0, len(audio), 4096):
+            await websocket.send_bytes(edge_audio_message(request_id, audio[start:start + 4096]))
+        await websocket.send_str(edge_text_message(request_id, "turn.end"))
+
+    return websocket
+
+def create_edge_app():
+    app = web.Application()
+    app["tones"] = {}
+    app.router.add_get("/edge/v1", edge_handler)
+    return app
+
+def make_tone_wav(duration_ms, sample_rate=22050):
+    """Генерує 16-бітний моно WAV з тоном заданої тривалості"""
+    num_samples = int(duration_ms * sample_rate / 1000)
+    frames = struct.pack(
+        f"<{num_samples}h",
+        *(int(9000 * math.sin(2 * math.pi * 180 * i / sample_rate)) for i in range(num_samples))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(frames)
+    return buffer.getvalue()
+
+# Голоси UA-ESPNET, як у Space robinhad/ukrainian-tts
+ESPNET_SPEAKERS = [
+    "Тетяна (жіночий) 👩", "Микита (чоловічий) 👨", "Лада (жіночий) 👩",
+    "Дмитро (чоловічий) 👨", "Олекса (чоловічий) 👨"
+]
+
+def espnet_config():
+    """Конфігурація Gradio застосунку: текст і голос на вході, аудіо і наголоси на виході"""
+    file_schema = {
+        "type": "object",
+        "properties": {"path": {"type": "string"}, "meta": {"default": {"_type": "gradio.FileData"}}},
+        "required": ["path"]
+    }
+    return {
+        "version": "5.0.0",
+        "protocol": "sse_v3",
+        "api_prefix": "/gradio_api",
+        "connect_heartbeat": False,
+        "components": [
+            {"id": 1, "type": "textbox", "props": {"label": "Текст"}, "api_info": {"type": "string"}},
+            {"id": 2, "type": "radio", "props": {"label": "Голос"},
+             "api_info": {"type": "string", "enum": ESPNET_SPEAKERS}},
+            {"id": 3, "type": "audio", "props": {"label": "Аудіо"}, "api_info": file_schema},
+            {"id": 4, "type": "textbox", "props": {"label": "Наголоси"}, "api_info": {"type": "string"}},
+            {"id": 5, "type": "button", "props": {}, "skip_api": True}
+        ],
+        "dependencies": [{
+            "id": 0,
+            "targets": [[5, "click"]],
+            "inputs": [1, 2],
+            "outputs": [3, 4],
+            "backend_fn": True,
+            "api_name": "predict",
+            "api_visibility": "public",
+            "queue": True
+        }]
+    }
+
+def espnet_api_info():
+    """Опис API у форматі /info?serialize=False"""
+    def parameter(name, component):
+        return {
+            "label": name, "parameter_name": name, "parameter_has_default": False,
+            "type": {"type": "string"}, "python_type": {"type": "str", "description": ""},
+            "component": component
+        }
+    return {
+        "named_endpoints": {"/predict": {
+            "parameters": [parameter("text", "Textbox"), parameter("speaker", "Radio")],
+            "returns": [
+                {"label": "Аудіо", "type": {"type": "object"}, "python_type": {"type": "filepath", "description": ""},
+                 "component": "Audio"},
+                {"label": "Наголоси", "type": {"type": "string"}, "python_type": {"type": "str", "description": ""},
+                 "component": "Textbox"}
+            ]
+        }},
+        "unnamed_endpoints": {}
+    }
+
+def sse_message(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+
+async def espnet_config_handler(request):
+    return web.json_response(espnet_config())
+
+async def espnet_info_handler(request):
+    return web.json_response(espnet_api_info())
+
+async def espnet_join_handler(request):
+    """Ставить запит у чергу; з імовірністю fail_rate відповідає 503, як перевантажений Space"""
+    app = request.app
+    if app["random"].random() < app["fail_rate"]:
+        return web.json_response({"detail": "Queue is full"}, status=503)
+
+    body = await request.json()
+    text, speaker = body["data"][0], body["data"][1]
+    event_id = uuid.uuid4().hex
+    session = app["sessions"].setdefault(body["session_hash"], {"queue": asyncio.Queue(), "active": 0})
+    session["active"] += 1
+    asyncio.ensure_future(espnet_process(app, session, event_id, text, speaker))
+    return web.json_response({"event_id": event_id})
+
+async def espnet_process(app, session, event_id, text, speaker):
+    """"Озвучує" текст тоном і кладе повідомлення в потік сесії"""
+    queue = session["queue"]
+    await queue.put({"msg": "estimation", "event_id": event_id, "rank": 0, "queue_size": 1, "rank_eta": app["latency"]})
+    await queue.put({"msg": "process_starts", "event_id": event_id, "eta": app["latency"]})
+    await asyncio.sleep(app["latency"])
+
+    duration_ms = max(200, len(text) * MS_PER_CHAR)
+    path = os.path.join(app["files_dir"], f"{event_id}.wav")
+    with open(path, 'wb') as f:
+        f.write(make_tone_wav(duration_ms))
+
+    session["active"] -= 1
+    await queue.put({
+        "msg": "process_completed",
+        "event_id": event_id,
+        "success": True,
+        "output": {"data": [
+            {"path": path, "orig_name": "audio.wav", "meta": {"_type": "gradio.FileData"}},
+            text
+        ]}
+    })
+
+async def espnet_data_handler(request):
+    """SSE потік повідомлень сесії; закривається, коли всі її запити виконано"""
+    session = request.app["sessions"].setdefault(
+        request.query["session_hash"], {"queue": asyncio.Queue(), "active": 0}
+    )
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    while True:
+        try:
+            message = await asyncio.wait_for(session["queue"].get(), timeout=15)
+        except asyncio.TimeoutError:
+            await response.write(sse_message({"msg": "heartbeat"}))
+            continue
+        await response.write(sse_message(message))
+        if message["msg"] == "process_completed" and session["active"] == 0 and session["queue"].empty():
+            await response.write(sse_message({"msg": "close_stream"}))
+            break
+    return response
+
+async def espnet_file_handler(request):
+    """Віддає згенерований WAV (лише з каталогу заглушки)"""
+    path = os.path.realpath(request.match_info["path"])
+    if not path.startswith(os.path.realpath(request.app["files_dir"])) or not os.path.exists(path):
+        raise web.HTTPNotFound()
+    return web.FileResponse(path)
+
+def create_espnet_app(latency=0.2, fail_rate=0.0, seed=0):
+    """Gradio-сумісна заглушка Space robinhad/ukrainian-tts (протокол sse_v3)"""
+    app = web.Application()
+    app["sessions"] = {}
+    app["latency"] = latency
+    app["fail_rate"] = fail_rate
+    app["random"] = random.Random(seed)
+    app["files_dir"] = tempfile.mkdtemp(prefix="espnet_stub_")
+    app.router.add_get("/config", espnet_config_handler)
+    app.router.add_get("/gradio_api/info", espnet_info_handler)
+    app.router.add_post("/gradio_api/queue/join", espnet_join_handler)
+    app.router.add_get("/gradio_api/queue/data", espnet_data_handler)
+    app.router.add_get("/gradio_api/file={path:.*}", espnet_file_handler)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальні заглушки TTS сервісів")
+    parser.add_argument("service", choices=["edge", "espnet"], help="Який сервіс імітувати")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Затримка обробки запиту ESPNET, с")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Частка запитів ESPNET, що отримують 503")
+    args = parser.parse_args()
+
+    if args.service == "edge":
+        print(f"Edge TTS заглушка: ws://{args.host}:{args.port}/edge/v1?TrustedClientToken=stub")
+        web.run_app(create_edge_app(), host=args.host, port=args.port, print=None)
+    elif args.service == "espnet":
+        print(f"UA-ESPNET заглушка: http://{args.host}:{args.port}/")
+        web.run_app(create_espnet_app(args.latency, args.fail_rate), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()